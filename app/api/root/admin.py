@@ -0,0 +1,67 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query, Response
+
+from app.core.cache import CacheStats, caches
+from app.core.database import PoolStats, engine, get_pool_stats
+from app.core.profiling import ProfileMode, profile_requests, profile_response, profile_worker
+from app.core.security import AllowRole, AuthenticatedUser
+from app.core.slow_queries import SlowQueryStats, slow_query_log
+from app.core.timing import TimedRoute
+from app.models.user_model import Role
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    route_class=TimedRoute,
+)
+
+
+@router.get("/caches")
+async def get_caches(
+    current_user: AuthenticatedUser, _: bool = Depends(AllowRole([Role.ADMIN]))
+) -> dict[str, CacheStats]:
+    """[Admin] Get caches statistics."""
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+@router.get("/pool")
+async def get_pool(current_user: AuthenticatedUser, _: bool = Depends(AllowRole([Role.ADMIN]))) -> PoolStats:
+    """[Admin] Get database connection pool statistics."""
+    return get_pool_stats(engine)
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    current_user: AuthenticatedUser, _: bool = Depends(AllowRole([Role.ADMIN])), limit: int = 20
+) -> list[SlowQueryStats]:
+    """[Admin] Get the slowest queries since startup, by normalized statement."""
+    return slow_query_log.top(limit)
+
+
+@router.get("/profile/worker", response_class=Response, responses={400: {"description": "Already profiling"}})
+async def get_worker_profile(
+    current_user: AuthenticatedUser,
+    _: bool = Depends(AllowRole([Role.ADMIN])),
+    seconds: Annotated[float, Query(gt=0)] = 10,
+    mode: ProfileMode = ProfileMode.PSTATS,
+):
+    """
+    [Admin] Profile the worker handling this request for the given time (up to `PROFILING_MAX_SECONDS`), and get the
+    profile: cProfile statistics, sampled call stacks in collapsed format, or allocations from tracemalloc.
+    """
+    return profile_response(mode, await profile_worker(mode, seconds))
+
+
+@router.get("/profile/requests", response_class=Response, responses={400: {"description": "Already profiling"}})
+async def get_requests_profile(
+    current_user: AuthenticatedUser,
+    _: bool = Depends(AllowRole([Role.ADMIN])),
+    count: Annotated[int, Query(ge=1)] = 10,
+    mode: ProfileMode = ProfileMode.PSTATS,
+):
+    """
+    [Admin] Profile the worker handling this request until it handled the given number of new requests (for up to
+    `PROFILING_MAX_SECONDS`), and get the profile.
+    """
+    return profile_response(mode, await profile_requests(mode, count))
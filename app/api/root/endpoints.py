@@ -3,11 +3,12 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 
-from app.core.security import AuthenticatedUser, Token, authenticate_user, generate_access_token
+from app.core.security import AuthenticatedUserInDb, Token, authenticate_user, generate_access_token
+from app.core.timing import TimedRoute
 from app.schema.user_schema import UserWithId
 from app.services.user_service import UserService
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.get("/")
@@ -30,11 +31,13 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     # Generate the access token
-    access_token = generate_access_token(data={"sub": user.email, "name": user.name})
+    access_token = generate_access_token(
+        data={"sub": user.email, "name": user.name, "uid": user.id, "role": user.role.name}
+    )
     return Token(access_token=access_token, token_type="bearer")
 
 
 @router.get("/me")
-def me(current_user: AuthenticatedUser) -> UserWithId:
+def me(current_user: AuthenticatedUserInDb) -> UserWithId:
     """Get current user data."""
     return current_user
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 
+from app.api.root.admin import router as admin_router
 from app.api.root.endpoints import router as root_router
 from app.api.v1.booking import router as booking_router
 from app.api.v1.resource import router as resource_router
@@ -8,7 +9,7 @@ from app.api.v1.user import router as user_router
 # Root endpoints
 root_routers = APIRouter()
 
-for router in [root_router]:
+for router in [root_router, admin_router]:
     root_routers.include_router(router)
 
 
@@ -1,15 +1,26 @@
-from fastapi import APIRouter, Depends
+from typing import Annotated
 
+from fastapi import APIRouter, Depends, Request
+
+from app.core.etag import ConditionalGet
+from app.core.fields import Fields
+from app.core.pagination import Pagination
+from app.core.responses import FastJSONResponse, ListResponse
 from app.core.security import AllowRole, AuthenticatedUser
+from app.core.timing import TimedRoute
 from app.models.user_model import Role
-from app.schema.booking_schema import BookingBase, BookingWithId
+from app.repositories.version_repository import ALL_BOOKINGS, RESOURCES, owner_bookings
+from app.schema.booking_schema import BookingBase, BookingBatchItem, BookingWithId, booking_list_adapter
 from app.services.booking_service import BookingService
 
 router = APIRouter(
     prefix="/bookings",
     tags=["bookings"],
+    route_class=TimedRoute,
 )
 
+BookingFields = Annotated[Fields, Depends(Fields.query(BookingWithId, booking_list_adapter))]
+
 
 @router.post("/", responses={400: {"description": "Value error"}, 404: {"description": "Resource not found"}})
 async def create(
@@ -19,6 +30,14 @@ async def create(
     return await service.create(booking, current_user)
 
 
+@router.post("/batch", responses={400: {"description": "Value error"}})
+async def create_batch(
+    bookings: list[BookingBase], current_user: AuthenticatedUser, service: BookingService = Depends()
+) -> list[BookingBatchItem]:
+    """Book several resources at once: bookings are checked against each other and created in a single transaction."""
+    return await service.create_many(bookings, current_user)
+
+
 @router.delete(
     "/{id}", status_code=204, responses={400: {"description": "Value error"}, 404: {"description": "Not found"}}
 )
@@ -27,35 +46,83 @@ async def delete(id: int, current_user: AuthenticatedUser, service: BookingServi
     await service.delete(id, current_user)
 
 
-@router.get("/")
+@router.get("/", response_model=list[BookingWithId], responses={304: {"description": "Not modified"}})
 async def get_list(
+    request: Request,
     current_user: AuthenticatedUser,
+    pagination: Annotated[Pagination, Depends()],
+    conditional: Annotated[ConditionalGet, Depends()],
+    fields: BookingFields,
     service: BookingService = Depends(),
-    offset: int = 0,
-    limit: int = 100,
     title: str | None = None,
-) -> list[BookingWithId]:
+) -> ListResponse:
     """List user bookings."""
-    return await service.get_list(offset, limit, current_user=current_user, all=False, search=title)
+    # Resources deletion also deletes their bookings
+    await conditional.check(owner_bookings(current_user.id), RESOURCES, user_id=current_user.id)
+    bookings = await service.get_list(
+        pagination.offset,
+        pagination.limit,
+        current_user=current_user,
+        all=False,
+        search=title,
+        after_id=pagination.after_id,
+        fields=fields.names,
+        after_rank=pagination.after_rank,
+    )
+    response = ListResponse(fields.list_adapter, bookings)
+    pagination.set_next_page(request, response, bookings)
+    conditional.set_etag(response)
+    return response
 
 
-@router.get("/all")
+@router.get("/all", response_model=list[BookingWithId], responses={304: {"description": "Not modified"}})
 async def get_list_all(
+    request: Request,
     current_user: AuthenticatedUser,
+    pagination: Annotated[Pagination, Depends()],
+    conditional: Annotated[ConditionalGet, Depends()],
+    fields: BookingFields,
     _: bool = Depends(AllowRole([Role.ADMIN])),
     service: BookingService = Depends(),
-    offset: int = 0,
-    limit: int = 100,
     title: str | None = None,
-) -> list[BookingWithId]:
+) -> ListResponse:
     """[Admin] List all bookings."""
-    return await service.get_list(offset, limit, current_user=current_user, all=True, search=title)
+    await conditional.check(ALL_BOOKINGS, RESOURCES, user_id=current_user.id)
+    bookings = await service.get_list(
+        pagination.offset,
+        pagination.limit,
+        current_user=current_user,
+        all=True,
+        search=title,
+        after_id=pagination.after_id,
+        fields=fields.names,
+        after_rank=pagination.after_rank,
+    )
+    response = ListResponse(fields.list_adapter, bookings)
+    pagination.set_next_page(request, response, bookings)
+    conditional.set_etag(response)
+    return response
 
 
-@router.get("/{id}", responses={404: {"description": "Not found"}})
-async def get(id: int, current_user: AuthenticatedUser, service: BookingService = Depends()) -> BookingWithId:
+@router.get(
+    "/{id}",
+    response_model=BookingWithId,
+    responses={304: {"description": "Not modified"}, 404: {"description": "Not found"}},
+)
+async def get(
+    id: int,
+    current_user: AuthenticatedUser,
+    conditional: Annotated[ConditionalGet, Depends()],
+    fields: BookingFields,
+    service: BookingService = Depends(),
+) -> FastJSONResponse:
     """Get a booking data."""
-    return await service.get(id, current_user)
+    # Checked once the booking is found and allowed, any change of its owner bookings changing its ETag
+    booking = await service.get(id, current_user)
+    await conditional.check(owner_bookings(booking.owner_id), item_id=id, user_id=current_user.id)
+    response = FastJSONResponse(fields.dump(booking))
+    conditional.set_etag(response)
+    return response
 
 
 @router.put("/{id}", responses={404: {"description": "Not found"}})
@@ -1,15 +1,29 @@
-from fastapi import APIRouter, Depends
+from datetime import datetime, timedelta
+from typing import Annotated
 
+from fastapi import APIRouter, Depends, Query, Request
+from pydantic import NonNegativeInt
+
+from app.core.etag import ConditionalGet
+from app.core.fields import Fields
+from app.core.pagination import Pagination
+from app.core.responses import FastJSONResponse, ListResponse
 from app.core.security import AllowRole, AuthenticatedUser
+from app.core.timing import TimedRoute
+from app.models.resource_model import RoomType
 from app.models.user_model import Role
-from app.schema.resource_schema import ResourceBase, ResourceWithId
+from app.repositories.version_repository import RESOURCES
+from app.schema.resource_schema import FreeSlot, ResourceBase, ResourceWithId, resource_list_adapter
 from app.services.resource_service import ResourceService
 
 router = APIRouter(
     prefix="/resources",
     tags=["resources"],
+    route_class=TimedRoute,
 )
 
+ResourceFields = Annotated[Fields, Depends(Fields.query(ResourceWithId, resource_list_adapter))]
+
 
 @router.post("/", responses={400: {"description": "Resource already exists"}})
 async def create(
@@ -33,23 +47,104 @@ async def delete(
     await service.delete(id)
 
 
-@router.get("/{id}", responses={404: {"description": "Not found"}})
-async def get(id: int, current_user: AuthenticatedUser, service: ResourceService = Depends()) -> ResourceWithId:
+@router.get("/available", response_model=list[ResourceWithId], responses={400: {"description": "Value error"}})
+async def get_available(
+    request: Request,
+    current_user: AuthenticatedUser,
+    start: datetime,
+    end: datetime,
+    pagination: Annotated[Pagination, Depends()],
+    fields: ResourceFields,
+    service: ResourceService = Depends(),
+    location: str | None = None,
+    room_type: RoomType | None = None,
+    min_capacity: NonNegativeInt | None = None,
+) -> ListResponse:
+    """List the resources matching the filters that are free for the whole slot."""
+    resources = await service.get_available(
+        start,
+        end,
+        pagination.offset,
+        pagination.limit,
+        location,
+        room_type,
+        min_capacity,
+        pagination.after_id,
+        fields.names,
+        pagination.after_rank,
+    )
+    response = ListResponse(fields.list_adapter, resources)
+    pagination.set_next_page(request, response, resources)
+    return response
+
+
+@router.get(
+    "/{id}",
+    response_model=ResourceWithId,
+    responses={304: {"description": "Not modified"}, 404: {"description": "Not found"}},
+)
+async def get(
+    id: int,
+    current_user: AuthenticatedUser,
+    conditional: Annotated[ConditionalGet, Depends()],
+    fields: ResourceFields,
+    service: ResourceService = Depends(),
+) -> FastJSONResponse:
     """Get a resource data."""
-    return await service.get(id)
+    # Checked once the resource is known to exist, so 'If-None-Match: *' is not answered for a missing one
+    (version,) = await conditional.load_versions(RESOURCES)
+    resource = await service.get(id, version=version)
+    await conditional.check(RESOURCES, item_id=id)
+    response = FastJSONResponse(fields.dump(resource))
+    conditional.set_etag(response)
+    return response
+
+
+@router.get("/{id}/free-slots", responses={400: {"description": "Value error"}, 404: {"description": "Not found"}})
+async def get_free_slots(
+    id: int,
+    current_user: AuthenticatedUser,
+    to: datetime,
+    duration: timedelta,
+    from_: Annotated[datetime | None, Query(alias="from")] = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 10,
+    service: ResourceService = Depends(),
+) -> list[FreeSlot]:
+    """List the first free windows of a resource lasting at least 'duration', between 'from' (or now) and 'to'."""
+    return await service.get_free_slots(id, from_ or datetime.now().astimezone(), to, duration, limit)
 
 
-@router.get("/")
+@router.get("/", response_model=list[ResourceWithId], responses={304: {"description": "Not modified"}})
 async def get_list(
+    request: Request,
     current_user: AuthenticatedUser,
+    pagination: Annotated[Pagination, Depends()],
+    conditional: Annotated[ConditionalGet, Depends()],
+    fields: ResourceFields,
     service: ResourceService = Depends(),
-    offset: int = 0,
-    limit: int = 100,
     name: str | None = None,
     location: str | None = None,
-) -> list[ResourceWithId]:
+    room_type: RoomType | None = None,
+    min_capacity: NonNegativeInt | None = None,
+) -> ListResponse:
     """List all resources."""
-    return await service.get_list(offset, limit, name, location)
+    await conditional.check(RESOURCES)
+    resources = await service.get_list(
+        pagination.offset,
+        pagination.limit,
+        name,
+        location,
+        room_type,
+        min_capacity,
+        pagination.after_id,
+        fields.names,
+        pagination.after_rank,
+        version=conditional.versions[0],
+    )
+    response = ListResponse(fields.list_adapter, resources)
+    pagination.set_next_page(request, response, resources)
+    conditional.set_etag(response)
+    return response
 
 
 @router.put("/{id}", responses={404: {"description": "Not found"}})
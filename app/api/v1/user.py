@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends
+from typing import Annotated
 
+from fastapi import APIRouter, Depends, Request
+
+from app.core.pagination import Pagination
+from app.core.responses import ListResponse
 from app.core.security import AllowRole, AuthenticatedUser
+from app.core.timing import TimedRoute
 from app.models.user_model import Role
-from app.schema.user_schema import UserWithId, UserWithPwd
+from app.schema.user_schema import UserWithId, UserWithPwd, user_list_adapter
 from app.services.user_service import UserService
 
 router = APIRouter(
     prefix="/users",
     tags=["users"],
+    route_class=TimedRoute,
 )
 
 
@@ -34,9 +40,15 @@ async def get(id: int, current_user: AuthenticatedUser, service: UserService = D
     return await service.get(id)
 
 
-@router.get("/")
+@router.get("/", response_model=list[UserWithId])
 async def get_list(
-    current_user: AuthenticatedUser, service: UserService = Depends(), offset: int = 0, limit: int = 100
-) -> list[UserWithId]:
+    request: Request,
+    current_user: AuthenticatedUser,
+    pagination: Annotated[Pagination, Depends()],
+    service: UserService = Depends(),
+) -> ListResponse:
     """List all users."""
-    return await service.get_list(offset, limit)
+    users = await service.get_list(pagination.offset, pagination.limit, pagination.after_id)
+    response = ListResponse(user_list_adapter, users)
+    pagination.set_next_page(request, response, users)
+    return response
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from app.core.settings import get_settings
+
+
+class ResourceSchedule:
+    """Bookings of a single resource, kept sorted by start date so conflict checks are a binary search."""
+
+    def __init__(self, bookings: list[tuple[int, datetime, datetime]]):
+        self.slots: list[tuple[datetime, datetime, int]] = sorted(
+            (start.astimezone(), end.astimezone(), id) for id, start, end in bookings
+        )
+        self.starts: list[datetime] = [slot[0] for slot in self.slots]
+        # Longest booking ever indexed: bounds how far back an overlapping booking can start
+        self.max_duration = max((end - start for start, end, _ in self.slots), default=timedelta(0))
+        self.loaded_at = time.monotonic()
+
+    def is_available(self, start: datetime, end: datetime, exclude_id: int = None) -> bool:
+        """Return whether no booking (except the excluded one) overlaps the [start, end[ slot."""
+        start, end = start.astimezone(), end.astimezone()
+        # Only bookings starting before the end of the slot can overlap it
+        index = bisect_left(self.starts, end) - 1
+        while index >= 0 and self.starts[index] > start - self.max_duration:
+            _, slot_end, id = self.slots[index]
+            if slot_end > start and id != exclude_id:
+                return False
+            index -= 1
+        return True
+
+    def add(self, id: int, start: datetime, end: datetime):
+        start, end = start.astimezone(), end.astimezone()
+        index = bisect_left(self.starts, start)
+        self.starts.insert(index, start)
+        self.slots.insert(index, (start, end, id))
+        self.max_duration = max(self.max_duration, end - start)
+
+    def remove(self, id: int, start: datetime):
+        start = start.astimezone()
+        index = bisect_left(self.starts, start)
+        while index < len(self.slots) and self.starts[index] == start:
+            if self.slots[index][2] == id:
+                del self.slots[index]
+                del self.starts[index]
+                return
+            index += 1
+
+
+class ResourceLock:
+    """Lock of a resource, with the number of requests holding or waiting for it."""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class AvailabilityIndex:
+    """
+    Per-process index of resource bookings used to check availability without querying the database.
+
+    Schedules are loaded lazily from the database on first access and kept up to date by the booking service. They
+    expire after `AVAILABILITY_INDEX_TTL` seconds so bookings made by other workers are eventually seen, and only the
+    `AVAILABILITY_INDEX_SIZE` most recently used ones are kept.
+    """
+
+    def __init__(self):
+        self.schedules: OrderedDict[int, ResourceSchedule] = OrderedDict()
+        self.locks: dict[int, ResourceLock] = {}
+
+    def get(self, resource_id: int) -> ResourceSchedule | None:
+        schedule = self.schedules.get(resource_id)
+        if schedule is None:
+            return None
+        if time.monotonic() - schedule.loaded_at > get_settings().AVAILABILITY_INDEX_TTL:
+            del self.schedules[resource_id]
+            return None
+        self.schedules.move_to_end(resource_id)
+        return schedule
+
+    def load(self, resource_id: int, bookings: list[tuple[int, datetime, datetime]]) -> ResourceSchedule:
+        schedule = ResourceSchedule(bookings)
+        self.schedules[resource_id] = schedule
+        self.schedules.move_to_end(resource_id)
+        while len(self.schedules) > get_settings().AVAILABILITY_INDEX_SIZE:
+            self.schedules.popitem(last=False)
+        return schedule
+
+    @asynccontextmanager
+    async def lock(self, resource_id: int):
+        """
+        Lock to hold between an availability check and the corresponding write on the resource.
+
+        Only kept while held or awaited, so locks do not pile up for every resource ever booked.
+        """
+        resource_lock = self.locks.get(resource_id)
+        if resource_lock is None:
+            resource_lock = self.locks[resource_id] = ResourceLock()
+        resource_lock.users += 1
+        try:
+            async with resource_lock.lock:
+                yield
+        finally:
+            resource_lock.users -= 1
+            if not resource_lock.users:
+                del self.locks[resource_id]
+
+    def add(self, resource_id: int, id: int, start: datetime, end: datetime):
+        if schedule := self.schedules.get(resource_id):
+            schedule.add(id, start, end)
+
+    def remove(self, resource_id: int, id: int, start: datetime):
+        if schedule := self.schedules.get(resource_id):
+            schedule.remove(id, start)
+
+    def invalidate(self, resource_id: int):
+        self.schedules.pop(resource_id, None)
+
+    def clear(self):
+        self.schedules.clear()
+
+
+availability_index = AvailabilityIndex()
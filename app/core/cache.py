@@ -0,0 +1,104 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from pydantic import BaseModel, computed_field
+
+from app.core.settings import get_settings
+
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+
+    @computed_field
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class Cache(ABC):
+    """
+    Cache backend interface.
+
+    Values must be plain data (dict, list, str, numbers...) so backends shared between workers can serialize them.
+    """
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Any | None:
+        pass
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any):
+        pass
+
+    @abstractmethod
+    def delete(self, key: Hashable):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def stats(self) -> CacheStats:
+        pass
+
+
+class LRUCache(Cache):
+    """In-process cache, evicting least recently used entries beyond `maxsize` and entries older than `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> CacheStats:
+        return CacheStats(hits=self.hits, misses=self.misses, size=len(self.entries), maxsize=self.maxsize)
+
+
+# Application caches, by name. Replace an entry with another `Cache` implementation to share it between workers.
+caches: dict[str, Cache] = {
+    "users": LRUCache(get_settings().USER_CACHE_SIZE, get_settings().USER_CACHE_TTL),
+    "resources": LRUCache(get_settings().RESOURCE_CACHE_SIZE, get_settings().RESOURCE_CACHE_TTL),
+}
+
+
+def get_cache(name: str) -> Cache:
+    return caches[name]
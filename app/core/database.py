@@ -1,15 +1,194 @@
-from typing import Annotated
+import math
+import time
+from typing import Annotated, Callable
 
-from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from fastapi import Depends, Request
+from pydantic import BaseModel
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.core.metrics import Gauge, record_query_metrics, registry
+from app.core.queries import query_tracker
 from app.core.settings import get_settings
+from app.core.slow_queries import log_slow_query
+from app.core.timing import request_timings
 
-engine = create_async_engine(get_settings().DATABASE_URL)
+
+class PoolStats(BaseModel):
+    size: int | None = None
+    checked_in: int | None = None
+    checked_out: int | None = None
+    overflow: int | None = None
+    checkouts: int | None = None
+    checkout_timeouts: int | None = None
+    checkout_time_total: float | None = None
+    checkout_time_max: float | None = None
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Connection pool recording the time spent waiting for a connection and the checkouts timing out."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.checkouts += 1
+            self.checkout_time_total += duration
+            self.checkout_time_max = max(self.checkout_time_max, duration)
+
+
+def get_engine_options(url: str) -> dict:
+    """Return the engine options configured in settings for the given database."""
+    settings = get_settings()
+    url = make_url(url)
+    # SQLite is only used locally and for tests, keep its specific default pool
+    if url.get_backend_name() == "sqlite":
+        return {}
+    options = {
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+def enable_foreign_keys(engine: AsyncEngine) -> None:
+    """Enforce foreign keys (and their ON DELETE CASCADE) on SQLite, which ignores them by default."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_foreign_keys_pragma(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Enforce foreign keys on SQLite, and time each query run by the engine once for all the instrumentations: 'db'
+    phase of the request timings, query budget tracking, query metrics and slow queries log.
+    """
+    enable_foreign_keys(engine)
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if timings := request_timings.get():
+            timings.start("db")
+        if tracker := query_tracker.get():
+            tracker.add(statement)
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        if timings := request_timings.get():
+            timings.stop("db")
+        record_query_metrics(statement, duration)
+        log_slow_query(engine, statement, parameters, executemany, duration)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def handle_error(context):
+        if starts := context.connection is not None and context.connection.info.get("query_start"):
+            starts.pop()
+        timings = request_timings.get()
+        if timings and timings.stack and timings.stack[-1][0] == "db":
+            timings.stop("db")
+
+
+def get_pool_stats(engine: AsyncEngine) -> PoolStats:
+    """Return the given engine connection pool usage, as far as its pool class allows it."""
+    pool = engine.pool
+    stats = PoolStats()
+    if isinstance(pool, QueuePool):
+        stats.size = pool.size()
+        stats.checked_in = pool.checkedin()
+        stats.checked_out = pool.checkedout()
+        stats.overflow = pool.overflow()
+    if isinstance(pool, InstrumentedPool):
+        stats.checkouts = pool.checkouts
+        stats.checkout_timeouts = pool.checkout_timeouts
+        stats.checkout_time_total = pool.checkout_time_total
+        stats.checkout_time_max = pool.checkout_time_max
+    return stats
+
+
+# Cookie holding the time of the client last write, so any worker can tell whether it wrote recently
+LAST_WRITE_COOKIE = "last_write"
+
+
+def wrote_recently(cookies: dict) -> bool:
+    """Return whether the client cookies tell it wrote in the last `READ_YOUR_WRITES_SECONDS`."""
+    try:
+        last_write = float(cookies.get(LAST_WRITE_COOKIE, ""))
+    except ValueError:
+        return False
+    return time.time() - last_write <= get_settings().READ_YOUR_WRITES_SECONDS
+
+
+class ReadYourWritesMiddleware:
+    """
+    Set the last write cookie on the responses of successful write requests.
+
+    The write time is kept by the client rather than by the worker, as its next request may reach another worker.
+    """
+
+    SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in self.SAFE_METHODS:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                max_age = math.ceil(get_settings().READ_YOUR_WRITES_SECONDS)
+                cookie = f"{LAST_WRITE_COOKIE}={time.time():.3f}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+engine = create_async_engine(get_settings().DATABASE_URL, **get_engine_options(get_settings().DATABASE_URL))
+
+instrument_engine(engine)
 
 DbAsyncSession = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
+if get_settings().DATABASE_READ_URL:
+    read_engine = create_async_engine(
+        get_settings().DATABASE_READ_URL, **get_engine_options(get_settings().DATABASE_READ_URL)
+    )
+    instrument_engine(read_engine)
+    DbReadAsyncSession = sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
+else:
+    read_engine = None
+    DbReadAsyncSession = None
+
 
 async def get_session():
     async with DbAsyncSession() as session:
@@ -17,3 +196,30 @@ async def get_session():
 
 
 DBSession = Annotated[AsyncSession, Depends(get_session)]
+
+
+async def get_read_session(request: Request, db: DBSession):
+    """Session for read-only queries: on the read replica if any, unless the client wrote recently."""
+    if DbReadAsyncSession is None or wrote_recently(request.cookies):
+        yield db
+        return
+    async with DbReadAsyncSession() as session:
+        yield session
+
+
+DBReadSession = Annotated[AsyncSession, Depends(get_read_session)]
+
+
+def get_pool_stat(field: str) -> Callable[[], dict[tuple, float]]:
+    """Return a function reading the given pool statistic of each engine, for metrics."""
+
+    def values() -> dict[tuple, float]:
+        engines = {"primary": engine, "replica": read_engine}
+        stats = {name: getattr(get_pool_stats(e), field) for name, e in engines.items() if e is not None}
+        return {(name,): value for name, value in stats.items() if value is not None}
+
+    return values
+
+
+for field in PoolStats.model_fields:
+    registry.register(Gauge(f"db_pool_{field}", f"Database connection pool {field}", ["engine"], get_pool_stat(field)))
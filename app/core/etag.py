@@ -0,0 +1,44 @@
+from fastapi import Depends, Request, Response
+
+from app.core.exceptions import NotModifiedException
+from app.repositories.version_repository import VersionRepository
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Return whether the 'If-None-Match' header value matches the given ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+class ConditionalGet:
+    """
+    Conditional GET requests handling.
+
+    The ETag is built from the change versions of the returned data, so an unchanged response is answered with a
+    '304 Not Modified' before running its query or serializing anything.
+    """
+
+    def __init__(self, request: Request, version_repository: VersionRepository = Depends()):
+        self.request = request
+        self.version_repository = version_repository
+        self.etag = None
+        self.versions = None
+
+    async def load_versions(self, *keys: str) -> list[int]:
+        """Load the versions of the given keys ahead of `check()`, e.g. to key a cache with them."""
+        self.versions = await self.version_repository.get(*keys)
+        return self.versions
+
+    async def check(self, *keys: str, item_id: int = None, user_id: int = None):
+        """Compute the ETag of the data (or of the item) versioned by the given keys, as seen by the given user."""
+        if self.versions is None:
+            self.versions = await self.version_repository.get(*keys)
+        parts = [*self.versions, item_id, user_id]
+        self.etag = 'W/"' + "-".join(str(part) for part in parts if part is not None) + '"'
+        if etag_matches(self.request.headers.get("if-none-match"), self.etag):
+            raise NotModifiedException(self.etag)
+
+    def set_etag(self, response: Response):
+        response.headers["ETag"] = self.etag
@@ -21,6 +21,16 @@ class NotFoundException(HTTPException):
         super().__init__(status.HTTP_404_NOT_FOUND, detail)
 
 
+class NotModifiedException(HTTPException):
+    def __init__(self, etag: str):
+        super().__init__(status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+class ServiceUnavailableException(HTTPException):
+    def __init__(self, detail="Service temporarily unavailable", retry_after: int = 1):
+        super().__init__(status.HTTP_503_SERVICE_UNAVAILABLE, detail, headers={"Retry-After": str(retry_after)})
+
+
 class ValidationException(HTTPException):
     def __init__(self, detail="Cannot save object"):
         super().__init__(status.HTTP_400_BAD_REQUEST, detail)
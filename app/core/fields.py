@@ -0,0 +1,50 @@
+from functools import lru_cache
+from typing import Any, Callable
+
+from fastapi import Query
+from pydantic import BaseModel, TypeAdapter, create_model
+
+from app.core.exceptions import ValidationException
+
+
+@lru_cache
+def partial_list_adapter(schema: type[BaseModel], names: tuple[str, ...]) -> TypeAdapter:
+    """Return the list adapter of the schema restricted to the given fields, built once per fields combination."""
+    fields = {name: (info.annotation, info) for name, info in schema.model_fields.items() if name in names}
+    return TypeAdapter(list[create_model(f"{schema.__name__}Fields", **fields)])
+
+
+class Fields:
+    """
+    Sparse fieldsets: fields of the schema selected with the 'fields' query parameter.
+
+    Selected fields are the only columns fetched by list queries and the only ones returned. The ID is always
+    included, for cursor pagination.
+    """
+
+    def __init__(self, schema: type[BaseModel], names: tuple[str, ...] | None, list_adapter: TypeAdapter):
+        self.schema = schema
+        # None when all fields are selected
+        self.names = names
+        self.list_adapter = list_adapter
+
+    def dump(self, object: Any) -> dict:
+        """Return the selected fields of the given object, serialized to JSON types."""
+        return self.schema.model_validate(object).model_dump(mode="json", include=self.names and set(self.names))
+
+    @classmethod
+    def query(cls, schema: type[BaseModel], list_adapter: TypeAdapter) -> Callable[..., "Fields"]:
+        """Return the dependency reading the fields of the given schema, `list_adapter` serializing all of them."""
+
+        def dependency(
+            fields: str | None = Query(None, description="Comma separated fields to return, all by default"),
+        ) -> Fields:
+            if not fields:
+                return cls(schema, None, list_adapter)
+            names = {name.strip() for name in fields.split(",") if name.strip()}
+            if unknown := names - schema.model_fields.keys():
+                raise ValidationException(f"Unknown fields: {', '.join(sorted(unknown))}")
+            names = tuple(name for name in schema.model_fields if name in names | {"id"})
+            return cls(schema, names, partial_list_adapter(schema, names))
+
+        return dependency
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from app.core.metrics import Counter, Histogram, registry
+from app.core.request_context import get_route, request_scope
+
+logger = logging.getLogger(__name__)
+
+loop_lag = registry.register(
+    Histogram(
+        "event_loop_lag_seconds",
+        "Delay of the event loop in running scheduled callbacks",
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    )
+)
+loop_blocked = registry.register(
+    Counter("event_loop_blocked_total", "Event loop blocked beyond the lag threshold, by route", ["route"])
+)
+
+
+class LoopLagMonitor:
+    """
+    Event loop lag monitor: a task measures how late the loop wakes it up, and a watchdog thread captures the stack
+    of the loop thread while it is blocked beyond `threshold` seconds, since the loop itself cannot run meanwhile.
+    """
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.heartbeat = time.monotonic()
+        # Whether the current blocking was already reported
+        self.reported = False
+        self.stopped = threading.Event()
+
+    async def measure(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            loop_lag.observe(max(loop.time() - start - self.interval, 0))
+            self.heartbeat = time.monotonic()
+            self.reported = False
+
+    def watch(self, loop: asyncio.AbstractEventLoop, thread_id: int):
+        while not self.stopped.wait(self.interval):
+            blocked = time.monotonic() - self.heartbeat - self.interval
+            if blocked < self.threshold or self.reported:
+                continue
+            frame = sys._current_frames().get(thread_id)
+            task = asyncio.current_task(loop)
+            # Context variables of the task, as this thread has its own
+            route = get_route(task.get_context().get(request_scope) if task else None)
+            # Checked again: the loop may have been unblocked while capturing
+            if frame is None or time.monotonic() - self.heartbeat - self.interval < self.threshold:
+                continue
+            self.reported = True
+            loop_blocked.inc(route)
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning("Event loop blocked for more than %.3fs by %s:\n%s", blocked, route, stack)
+
+    async def start(self):
+        self.heartbeat = time.monotonic()
+        self.task = asyncio.create_task(self.measure())
+        self.thread = threading.Thread(
+            target=self.watch,
+            args=(asyncio.get_running_loop(), threading.get_ident()),
+            name="loop-lag-watchdog",
+            daemon=True,
+        )
+        self.thread.start()
+
+    async def stop(self):
+        self.stopped.set()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.thread.join()
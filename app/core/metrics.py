@@ -0,0 +1,204 @@
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.exceptions import AuthenticationException, NotFoundException
+from app.core.settings import get_settings
+
+# Latency buckets in seconds, from a cache hit to a request close to the load balancer timeout
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """
+    Metric values by labels, in Prometheus text format.
+
+    Each thread updates its own shard of the values, without any lock: the shards are only summed up when the
+    metrics are collected, so recording stays cheap under many concurrent requests.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.shards: list[dict] = []
+        self.local = threading.local()
+        # Only taken by the first update of each thread
+        self.lock = threading.Lock()
+
+    def shard(self) -> dict:
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = {}
+            with self.lock:
+                self.shards.append(shard)
+            return shard
+
+    def collect(self) -> dict[tuple, list]:
+        """Return the values of all the threads, summed up by labels."""
+        values = {}
+        for shard in list(self.shards):
+            # Copying a dict is atomic, unlike iterating over a dict updated by another thread
+            for labels, value in shard.copy().items():
+                total = values.setdefault(labels, [0] * len(value))
+                for i, v in enumerate(value):
+                    total[i] += v
+        return values
+
+    def format_labels(self, labels: tuple, **extra) -> str:
+        pairs = [*zip(self.labelnames, labels), *extra.items()]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{escape(str(value))}"' for name, value in pairs) + "}"
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self.format_labels(labels)} {value[0]}" for labels, value in self.collect().items()]
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}", *self.samples()])
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, value: float = 1):
+        shard = self.shard()
+        entry = shard.get(labels)
+        if entry is None:
+            shard[labels] = [value]
+        else:
+            entry[0] += value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        shard = self.shard()
+        # Count in each bucket, then the sum and the count of the observed values
+        entry = shard.get(labels)
+        if entry is None:
+            entry = shard[labels] = [0] * (len(self.buckets) + 3)
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def samples(self) -> list[str]:
+        samples = []
+        for labels, entry in self.collect().items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), entry):
+                cumulative += count
+                samples.append(f"{self.name}_bucket{self.format_labels(labels, le=bound)} {cumulative}")
+            samples.append(f"{self.name}_sum{self.format_labels(labels)} {entry[-2]}")
+            samples.append(f"{self.name}_count{self.format_labels(labels)} {entry[-1]}")
+        return samples
+
+
+class Gauge(Metric):
+    """Metric read when collected, from a function returning the values by labels."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str], function: Callable[[], dict[tuple, float]]):
+        super().__init__(name, help, labelnames)
+        self.function = function
+
+    def collect(self) -> dict[tuple, list]:
+        return {labels: [value] for labels, value in self.function().items()}
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(
+    Counter("http_requests_total", "HTTP requests, by route template and status code", ["method", "route", "status"])
+)
+http_request_duration = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP requests duration, by route template", ["method", "route"])
+)
+db_queries = registry.register(Counter("db_queries_total", "Database queries, by statement type", ["statement"]))
+db_query_duration = registry.register(
+    Histogram("db_query_duration_seconds", "Database queries duration, by statement type", ["statement"])
+)
+booking_not_available = registry.register(
+    Counter("booking_not_available_total", "Bookings rejected as their resource is not available", ["operation"])
+)
+
+
+def record_query_metrics(statement: str, duration: float):
+    """Count the query and observe its duration, by statement type."""
+    kind = statement.split(maxsplit=1)[0].upper()
+    db_queries.inc(kind)
+    db_query_duration.observe(duration, kind)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware counting the requests by route template and status code, and observing their duration.
+
+    Requests matching no route are recorded under a single route label, so unknown paths cannot flood the metrics.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = route.path_format if route else "unmatched"
+            http_requests.inc(scope["method"], path, str(status))
+            http_request_duration.observe(time.perf_counter() - start, scope["method"], path)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Metrics of this worker, for scrapers sending the `METRICS_TOKEN` bearer token."""
+    token = get_settings().METRICS_TOKEN
+    if token is None:
+        raise NotFoundException()
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(credentials.encode(), token.encode()):
+        raise AuthenticationException()
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
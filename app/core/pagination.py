@@ -0,0 +1,59 @@
+import base64
+import json
+from typing import Annotated, Mapping
+
+from fastapi import Query, Request, Response
+
+from app.core.exceptions import ValidationException
+from app.core.settings import get_settings
+
+
+def encode_cursor(last_id: int, last_rank: float = None) -> str:
+    """Return an opaque cursor pointing after the given object ID (and search rank, for ranked results)."""
+    position = {"id": last_id} if last_rank is None else {"id": last_id, "rank": last_rank}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, float | None]:
+    """Return the object ID and search rank the given cursor points after."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        last_id, last_rank = position["id"], position.get("rank")
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValidationException("Invalid cursor")
+    if not isinstance(last_id, int) or not isinstance(last_rank, (int, float, type(None))):
+        raise ValidationException("Invalid cursor")
+    return last_id, last_rank
+
+
+class Pagination:
+    """
+    List endpoints pagination parameters, sorted by ID.
+
+    Pages are selected with 'offset', or with the 'cursor' returned by the previous page (keyset pagination, which
+    stays fast on deep pages). 'limit' is capped by `MAX_PAGE_SIZE`. Search results are sorted by relevance first.
+    """
+
+    def __init__(
+        self,
+        offset: Annotated[int, Query(ge=0)] = 0,
+        limit: Annotated[int, Query(ge=1)] = 100,
+        cursor: str | None = None,
+    ):
+        self.limit = min(limit, get_settings().MAX_PAGE_SIZE)
+        self.after_id, self.after_rank = decode_cursor(cursor) if cursor else (None, None)
+        # Offset is meaningless once positioned by the cursor
+        self.offset = 0 if self.after_id is not None else offset
+
+    def set_next_page(self, request: Request, response: Response, items: list) -> None:
+        """Add the next page cursor and link to the response headers when the page is full."""
+        if not items or len(items) < self.limit:
+            return
+        last = items[-1]
+        if isinstance(last, Mapping):
+            cursor = encode_cursor(last["id"], last.get("rank"))
+        else:
+            cursor = encode_cursor(last.id)
+        url = request.url.remove_query_params("offset").include_query_params(cursor=cursor)
+        response.headers["Link"] = f'<{url}>; rel="next"'
+        response.headers["X-Next-Cursor"] = cursor
@@ -0,0 +1,179 @@
+import asyncio
+import cProfile
+import enum
+import marshal
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import asynccontextmanager
+from enum import auto
+
+from fastapi import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.exceptions import ValidationException
+from app.core.settings import get_settings
+
+
+class ProfileMode(enum.StrEnum):
+    # cProfile statistics, to load with `pstats` or viewers like snakeviz
+    PSTATS = auto()
+    # Sampled call stacks, one 'frame;frame;frame count' line per stack, to load in flame graph tools
+    COLLAPSED = auto()
+    # Allocations since the start, by line, largest first
+    TRACEMALLOC = auto()
+
+
+class SamplingProfiler:
+    """Profiler sampling the call stack of a thread at regular intervals, from a thread of its own."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self) -> bytes:
+        self.stopped.set()
+        self.thread.join()
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode()
+
+
+class DeterministicProfiler:
+    """cProfile of the calling thread, i.e. the event loop, which runs all the requests coroutines."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self) -> bytes:
+        self.profile.disable()
+        self.profile.create_stats()
+        # Same format as `Profile.dump_stats()`
+        return marshal.dumps(self.profile.stats)
+
+
+class AllocationProfiler:
+    """Difference between tracemalloc snapshots taken at start and stop."""
+
+    def __init__(self, limit: int = 100):
+        self.limit = limit
+        self.started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.before = tracemalloc.take_snapshot()
+
+    def stop(self) -> bytes:
+        after = tracemalloc.take_snapshot()
+        if self.started_tracing:
+            tracemalloc.stop()
+        stats = after.compare_to(self.before, "lineno")[: self.limit]
+        return "".join(f"{stat}\n" for stat in stats).encode()
+
+
+class RequestCountdown:
+    """Number of requests left to profile, and event set once all of them are handled."""
+
+    def __init__(self, count: int):
+        self.remaining = count
+        self.done = asyncio.Event()
+
+    def finished(self):
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.done.set()
+
+
+# Only one profiling at a time: profilers of a thread exclude each other, and would profile each other
+profiling_lock = asyncio.Lock()
+# Requests to profile, None when not profiling requests
+request_countdown: RequestCountdown | None = None
+
+
+def get_profiler(mode: ProfileMode):
+    if mode == ProfileMode.PSTATS:
+        return DeterministicProfiler()
+    if mode == ProfileMode.COLLAPSED:
+        return SamplingProfiler(threading.get_ident(), get_settings().PROFILING_SAMPLE_INTERVAL)
+    return AllocationProfiler()
+
+
+@asynccontextmanager
+async def profiling(mode: ProfileMode):
+    """Profile the worker while in the context, then yield the profile as a list with a single artifact."""
+    if profiling_lock.locked():
+        raise ValidationException("Already profiling")
+    async with profiling_lock:
+        profiler = get_profiler(mode)
+        artifact = []
+        profiler.start()
+        try:
+            yield artifact
+        finally:
+            artifact.append(profiler.stop())
+
+
+async def profile_worker(mode: ProfileMode, seconds: float) -> bytes:
+    """Profile all the work done by this worker for the given time."""
+    async with profiling(mode) as artifact:
+        await asyncio.sleep(min(seconds, get_settings().PROFILING_MAX_SECONDS))
+    return artifact[0]
+
+
+async def profile_requests(mode: ProfileMode, count: int) -> bytes:
+    """Profile this worker until it handled the given number of new requests, or for `PROFILING_MAX_SECONDS`."""
+    global request_countdown
+    async with profiling(mode) as artifact:
+        request_countdown = RequestCountdown(count)
+        try:
+            await asyncio.wait_for(request_countdown.done.wait(), get_settings().PROFILING_MAX_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            request_countdown = None
+    return artifact[0]
+
+
+def profile_response(mode: ProfileMode, artifact: bytes) -> Response:
+    if mode == ProfileMode.PSTATS:
+        headers = {"Content-Disposition": 'attachment; filename="profile.pstats"'}
+        return Response(artifact, media_type="application/octet-stream", headers=headers)
+    return Response(artifact, media_type="text/plain")
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware counting the requests handled while profiling requests, doing nothing otherwise."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        countdown = request_countdown
+        if countdown is None or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            countdown.finished()
@@ -0,0 +1,83 @@
+import logging
+from collections import Counter
+from contextvars import ContextVar
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryTracker:
+    """Statements run while handling a request, to enforce a query budget and detect N+1 queries."""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def add(self, statement: str):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        """
+        Return the statements run at least `threshold` times, with their count.
+
+        Parameters are bound separately, so an identical statement run again and again is usually the same query
+        run for each item of a list (N+1 queries) instead of a single one for all items.
+        """
+        return {statement: count for statement, count in Counter(self.statements).items() if count >= threshold}
+
+    def report(self, threshold: int) -> str:
+        lines = [f"{self.count} queries"]
+        lines += [f"  {statement}" for statement in self.statements]
+        for statement, count in self.repeated(threshold).items():
+            lines.append(f"Repeated {count} times, N+1 candidate: {statement}")
+        return "\n".join(lines)
+
+
+# Tracker of the current request, None when disabled
+query_tracker: ContextVar[QueryTracker | None] = ContextVar("query_tracker", default=None)
+
+
+class QueryBudgetMiddleware:
+    """
+    Pure ASGI middleware logging a warning for the requests running more than `QUERY_BUDGET` queries, or the same
+    statement at least `N_PLUS_ONE_THRESHOLD` times.
+
+    Does nothing unless `QUERY_TRACKING` is enabled.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not get_settings().QUERY_TRACKING:
+            return await self.app(scope, receive, send)
+
+        tracker = QueryTracker()
+        token = query_tracker.set(tracker)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            query_tracker.reset(token)
+            settings = get_settings()
+            # Checks failed by the request
+            failed = []
+            if tracker.count > settings.QUERY_BUDGET:
+                failed.append(f"exceeds its query budget of {settings.QUERY_BUDGET}")
+            if tracker.repeated(settings.N_PLUS_ONE_THRESHOLD):
+                failed.append(f"runs a statement at least {settings.N_PLUS_ONE_THRESHOLD} times (N+1 queries)")
+            if failed:
+                route = scope.get("route")
+                path = route.path_format if route else scope["path"]
+                logger.warning(
+                    "%s %s %s: %s",
+                    scope["method"],
+                    path,
+                    " and ".join(failed),
+                    tracker.report(settings.N_PLUS_ONE_THRESHOLD),
+                )
@@ -0,0 +1,33 @@
+from contextvars import ContextVar
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Request being handled and its authenticated user, to tell where slow queries and blocking calls come from
+request_scope: ContextVar[Scope | None] = ContextVar("request_scope", default=None)
+request_user_id: ContextVar[int | None] = ContextVar("request_user_id", default=None)
+
+
+def get_route(scope: Scope | None) -> str:
+    """Return the method and route template of the request, under a single route for any unknown path."""
+    if scope is None:
+        return "no request"
+    route = scope.get("route")
+    return f"{scope['method']} {route.path_format if route else 'unmatched'}"
+
+
+class RequestScopeMiddleware:
+    """Pure ASGI middleware making the request being handled available to diagnostics."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        scope_token = request_scope.set(scope)
+        user_token = request_user_id.set(None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_scope.reset(scope_token)
+            request_user_id.reset(user_token)
@@ -0,0 +1,30 @@
+from typing import Any, Mapping, Sequence
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+
+from app.core.timing import timed
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded by pydantic-core instead of the standard library `json` module."""
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+class ListResponse(Response):
+    """
+    JSON response of list endpoints, built from plain database rows.
+
+    Rows are validated and serialized to bytes in one pass by a precompiled `TypeAdapter`, skipping the ORM objects
+    and FastAPI response model handling. Endpoints returning it declare the `response_model` for the docs.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, adapter: TypeAdapter, rows: Sequence[Mapping], **kwargs):
+        with timed("serialization"):
+            content = adapter.dump_json(adapter.validate_python(rows))
+        super().__init__(content, **kwargs)
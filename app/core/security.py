@@ -1,5 +1,8 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from typing import Annotated, Callable
 
 import jwt
 from fastapi import Depends, HTTPException, status
@@ -9,16 +12,26 @@ from passlib.context import CryptContext
 from pydantic import BaseModel
 from sqlmodel import select
 
-from app.core.database import DBSession
-from app.core.exceptions import NotFoundException
+from app.core.cache import get_cache
+from app.core.database import DBReadSession
+from app.core.exceptions import NotFoundException, ServiceUnavailableException
+from app.core.request_context import request_user_id
 from app.core.settings import get_settings
+from app.core.timing import timed
 from app.models.user_model import Role, UserInDb
+from app.schema.user_schema import UserWithId
 from app.services.user_service import UserService
 
 # Authent method: login + password -> JWT access token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=get_settings().API_PATH + "/token")
 # Password hash method
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=get_settings().PASSWORD_HASH_ROUNDS)
+# Hashing is CPU bound: run it in dedicated threads (bcrypt releases the GIL) to keep the event loop responsive
+password_executor = ThreadPoolExecutor(get_settings().PASSWORD_HASH_WORKERS, thread_name_prefix="password")
+# Admission control: hashes being computed or waiting for a thread, beyond that requests are rejected
+password_slots = threading.BoundedSemaphore(
+    get_settings().PASSWORD_HASH_WORKERS + get_settings().PASSWORD_HASH_QUEUE_SIZE
+)
 # Access token generation method
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
@@ -39,6 +52,26 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def run_password_task(func: Callable, *args):
+    """Run the given password hashing function in the password threads."""
+    if not password_slots.acquire(blocking=False):
+        raise ServiceUnavailableException("Too many authentication requests")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        password_slots.release()
+
+
+async def hash_password_async(password: str) -> str:
+    """Return a hashed password from the given password, without blocking the event loop."""
+    return await run_password_task(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Return whether the given clear password is the same as the hashed one, without blocking the event loop."""
+    return await run_password_task(verify_password, plain_password, hashed_password)
+
+
 async def authenticate_user(username: str, password: str, user_service: UserService) -> UserInDb:
     """
     Validate the given username (used as email) and password and return the corresponding user, of False if creds are
@@ -48,7 +81,7 @@ async def authenticate_user(username: str, password: str, user_service: UserServ
         user = await user_service.get_with_username(username)
     except NotFoundException:
         return False
-    if not verify_password(password, user.password):
+    if not await verify_password_async(password, user.password):
         return False
     return user
 
@@ -56,32 +89,68 @@ async def authenticate_user(username: str, password: str, user_service: UserServ
 def generate_access_token(data: dict):
     """Generate a JWT access token from given user data."""
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    if get_settings().STATELESS_TOKENS:
+        expire = datetime.now(timezone.utc) + timedelta(minutes=get_settings().STATELESS_TOKEN_EXPIRE_MINUTES)
+    else:
+        expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, get_settings().SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: DBSession):
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: DBReadSession) -> UserWithId:
     """Get current authenticated user from JWT."""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    # Validate the access token
-    try:
-        payload = jwt.decode(token, get_settings().SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    with timed("auth"):
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+        # Validate the access token
+        try:
+            payload = jwt.decode(token, get_settings().SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+        except InvalidTokenError:
             raise credentials_exception
-    except InvalidTokenError:
-        raise credentials_exception
-    # Get the corresponding user
-    user = (await db.execute(select(UserInDb).where(UserInDb.email == username))).scalars().first()
-    if not user:
-        raise credentials_exception
-    return user
+        # Build the user from the token claims, without checking it still exists
+        if get_settings().STATELESS_TOKENS and "uid" in payload and "role" in payload:
+            try:
+                role = Role[payload["role"]]
+            except KeyError:
+                raise credentials_exception
+            user = UserWithId.model_construct(id=payload["uid"], name=payload.get("name"), email=username, role=role)
+            request_user_id.set(user.id)
+            return user
+        # Get the corresponding user, from the cache when possible
+        user_cache = get_cache("users")
+        user_data = user_cache.get(username)
+        if user_data is None:
+            user = (await db.execute(select(UserInDb).where(UserInDb.email == username))).scalars().first()
+            if not user:
+                raise credentials_exception
+            user_data = UserWithId.model_validate(user).model_dump(mode="json")
+            user_cache.set(username, user_data)
+        user = UserWithId.model_validate(user_data)
+        request_user_id.set(user.id)
+        return user
+
+
+async def get_current_user_in_db(
+    user: Annotated[UserWithId, Depends(get_current_user)], user_service: UserService = Depends()
+) -> UserWithId:
+    """Get current authenticated user, checking it exists in database even with stateless tokens."""
+    if not get_settings().STATELESS_TOKENS:
+        return user
+    try:
+        return UserWithId.model_validate(await user_service.get(user.id))
+    except NotFoundException:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
 
 class AllowRole:
@@ -90,7 +159,7 @@ class AllowRole:
     def __init__(self, allowed_roles: list[Role]):
         self.allowed_roles = allowed_roles
 
-    def __call__(self, user: Annotated[UserInDb, Depends(get_current_user)]):
+    def __call__(self, user: Annotated[UserWithId, Depends(get_current_user)]):
         for role in self.allowed_roles:
             if user.role.value >= role.value:
                 return True
@@ -98,4 +167,6 @@ class AllowRole:
 
 
 # Helper for getting current authenticated user in endpoints
-AuthenticatedUser = Annotated[UserInDb, Depends(get_current_user)]
+AuthenticatedUser = Annotated[UserWithId, Depends(get_current_user)]
+# Same, for endpoints needing up to date user data
+AuthenticatedUserInDb = Annotated[UserWithId, Depends(get_current_user_in_db)]
@@ -1,5 +1,7 @@
+import os
 from functools import lru_cache
 
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,6 +10,61 @@ class Settings(BaseSettings):
     API_V1_PATH: str = "/api/v1"
     DATABASE_URL: str
     SECRET_KEY: str
+    # Database connection pool (ignored for SQLite): connections kept open, extra connections allowed under load,
+    # seconds to wait for a connection, seconds before recycling a connection (-1 to disable), whether to test
+    # connections before use, and asyncpg prepared statements cache size per connection (0 to disable)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Optional read replica used by read-only queries, except for clients who wrote in the last seconds
+    DATABASE_READ_URL: str | None = None
+    READ_YOUR_WRITES_SECONDS: float = 5
+    # Availability index: seconds before a resource schedule is reloaded from the database, and number of schedules
+    AVAILABILITY_INDEX_TTL: int = 60
+    AVAILABILITY_INDEX_SIZE: int = 10000
+    # Maximum number of bookings created by a single batch request
+    BOOKING_BATCH_MAX_SIZE: int = 1000
+    # Maximum number of objects returned by a list endpoint
+    MAX_PAGE_SIZE: int = 1000
+    # Authenticated users cache: number of users and seconds before reloading them from the database
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: int = 60
+    # Resources reads cache: number of responses and seconds before reloading them (writes of other workers)
+    RESOURCE_CACHE_SIZE: int = 256
+    RESOURCE_CACHE_TTL: int = 60
+    # Password hashing: bcrypt cost factor, threads dedicated to hashing and hashes allowed to wait for a thread
+    PASSWORD_HASH_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = Field(default_factory=lambda: os.cpu_count() or 1)
+    PASSWORD_HASH_QUEUE_SIZE: int = 64
+    # Trust user ID and role carried by access tokens instead of loading the user on each request. Tokens are then
+    # valid until they expire even if the user is deleted, so they are short lived.
+    STATELESS_TOKENS: bool = False
+    STATELESS_TOKEN_EXPIRE_MINUTES: int = 5
+    # Requests timing breakdown in the 'Server-Timing' response header, and in JSON log lines
+    SERVER_TIMING: bool = False
+    SERVER_TIMING_LOG: bool = False
+    # Log a warning for requests running more queries than the budget, or the same statement N+1 threshold times
+    QUERY_TRACKING: bool = False
+    QUERY_BUDGET: int = 10
+    N_PLUS_ONE_THRESHOLD: int = 3
+    # Log the queries taking more than this threshold (in seconds, None to disable), capturing their plan at most once
+    # per interval (in seconds) on PostgreSQL
+    SLOW_QUERY_THRESHOLD: float | None = 0.5
+    SLOW_QUERY_EXPLAIN_INTERVAL: float = 300
+    # Admin profiling: longest profiling (in seconds), and interval between call stack samples (in seconds)
+    PROFILING_MAX_SECONDS: float = 60
+    PROFILING_SAMPLE_INTERVAL: float = 0.005
+    # Event loop lag measured every interval (in seconds), blocking calls beyond the threshold (in seconds, None to
+    # disable the monitor) are logged with their stack
+    LOOP_LAG_INTERVAL: float = 0.1
+    LOOP_LAG_THRESHOLD: float | None = 0.25
+    # Path of the Prometheus metrics endpoint, outside of the API path, and bearer token required to scrape it (the
+    # endpoint is disabled when not set)
+    METRICS_PATH: str = "/metrics"
+    METRICS_TOKEN: str | None = None
 
     model_config = SettingsConfigDict(env_file="../.env")
 
@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import datetime
+import logging
+import re
+import threading
+import time
+from decimal import Decimal
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.request_context import get_route, request_scope, request_user_id
+from app.core.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Parameter values logged as is, others (e.g. names, emails, passwords hashes) are redacted
+SAFE_PARAMETER_TYPES = (int, float, bool, Decimal, datetime.date, datetime.time, datetime.timedelta, type(None))
+# Lists of placeholders of an IN clause, whatever the driver parameter style
+IN_PLACEHOLDERS = re.compile(
+    r"\bIN \(\s*(?:\?|\$\d+(?:::\w+)?|%\(\w+\)s)(?:\s*,\s*(?:\?|\$\d+(?:::\w+)?|%\(\w+\)s))*\s*\)"
+)
+
+
+class SlowQueryStats(BaseModel):
+    statement: str
+    count: int
+    total_time: float
+    max_time: float
+    plan: str | None = None
+
+
+def normalize(statement: str) -> str:
+    """Return the statement without its formatting, and with any IN list as a single item, to group its runs."""
+    return IN_PLACEHOLDERS.sub("IN (...)", " ".join(statement.split()))
+
+
+def redact(parameters):
+    """Return the given statement parameters with their text and binary values replaced."""
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    return parameters if isinstance(parameters, SAFE_PARAMETER_TYPES) else "***"
+
+
+class SlowQueryLog:
+    """Slow statements since startup, by normalized statement, with their last captured query plan."""
+
+    def __init__(self):
+        self.stats: dict[str, SlowQueryStats] = {}
+        # Last plan capture of each statement, to capture at most one every `SLOW_QUERY_EXPLAIN_INTERVAL`
+        self.explained_at: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def add(self, statement: str, duration: float) -> bool:
+        """Record a slow run of the (normalized) statement, return whether its plan should be captured again."""
+        with self.lock:
+            stats = self.stats.get(statement)
+            if stats is None:
+                stats = self.stats[statement] = SlowQueryStats(statement=statement, count=0, total_time=0, max_time=0)
+            stats.count += 1
+            stats.total_time += duration
+            stats.max_time = max(stats.max_time, duration)
+            now = time.monotonic()
+            if now - self.explained_at.get(statement, -float("inf")) < get_settings().SLOW_QUERY_EXPLAIN_INTERVAL:
+                return False
+            self.explained_at[statement] = now
+            return True
+
+    def set_plan(self, statement: str, plan: str):
+        with self.lock:
+            self.stats[statement].plan = plan
+
+    def top(self, limit: int) -> list[SlowQueryStats]:
+        """Return the slowest statements first."""
+        with self.lock:
+            return sorted(self.stats.values(), key=lambda stats: stats.max_time, reverse=True)[:limit]
+
+    def clear(self):
+        with self.lock:
+            self.stats.clear()
+            self.explained_at.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+async def explain(engine: AsyncEngine, statement: str, parameters, normalized: str):
+    """Capture the plan of the statement on a connection of its own, without running it."""
+    try:
+        async with engine.connect() as connection:
+            result = await connection.exec_driver_sql(f"EXPLAIN (ANALYZE off) {statement}", parameters)
+            plan = "\n".join(row[0] for row in result)
+    except Exception:
+        logger.exception("Cannot capture the plan of slow query: %s", normalized)
+        return
+    slow_query_log.set_plan(normalized, plan)
+    logger.warning("Plan of slow query: %s\n%s", normalized, plan)
+
+
+# Plan captures running, tasks only being weakly referenced by the event loop
+explain_tasks: set[asyncio.Task] = set()
+
+
+def log_slow_query(engine: AsyncEngine, statement: str, parameters, executemany: bool, duration: float):
+    """
+    Log the query if it took more than `SLOW_QUERY_THRESHOLD` seconds, and record it by normalized statement. On
+    PostgreSQL, its plan is also captured in the background.
+    """
+    threshold = get_settings().SLOW_QUERY_THRESHOLD
+    if threshold is None or duration < threshold:
+        return
+    normalized = normalize(statement)
+    logger.warning(
+        "Slow query (%.3fs) on %s by user %s: %s %s",
+        duration,
+        get_route(request_scope.get()),
+        request_user_id.get(),
+        normalized,
+        redact(parameters),
+    )
+    should_explain = slow_query_log.add(normalized, duration)
+    if should_explain and engine.dialect.name == "postgresql" and not executemany:
+        if statement.lstrip()[:7].upper() in ("SELECT ", "INSERT ", "UPDATE ", "DELETE ") and not explain_tasks:
+            # Run outside of the request context, so its query is not timed or tracked as part of the request
+            task = asyncio.get_running_loop().create_task(
+                explain(engine, statement, parameters, normalized), context=contextvars.Context()
+            )
+            explain_tasks.add(task)
+            task.add_done_callback(explain_tasks.discard)
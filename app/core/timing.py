@@ -0,0 +1,193 @@
+import functools
+import inspect
+import json
+import logging
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimings:
+    """
+    Time spent by a request in each phase, in seconds.
+
+    Phases can be nested: the time of a nested phase (e.g. a query run by the service) is only counted in the nested
+    one, so durations add up to the request time.
+    """
+
+    def __init__(self):
+        self.durations: dict[str, float] = defaultdict(float)
+        self.counts: dict[str, int] = defaultdict(int)
+        # Running phases: [name, start time, time spent in nested phases]
+        self.stack: list[list] = []
+
+    def start(self, name: str):
+        self.stack.append([name, time.perf_counter(), 0.0])
+
+    def stop(self, name: str):
+        """Stop the given phase if running, dropping the phases nested in it left running by an error."""
+        if all(phase[0] != name for phase in self.stack):
+            return
+        while self.stack[-1][0] != name:
+            self.stack.pop()
+        name, start, nested = self.stack.pop()
+        duration = time.perf_counter() - start
+        self.durations[name] += duration - nested
+        self.counts[name] += 1
+        if self.stack:
+            self.stack[-1][2] += duration
+
+    def header(self, total: float) -> str:
+        """Return the 'Server-Timing' header value, durations in milliseconds."""
+        metrics = []
+        for name, duration in self.durations.items():
+            metric = f"{name};dur={duration * 1000:.2f}"
+            if name == "db":
+                metric += f';desc="{self.counts[name]} queries"'
+            metrics.append(metric)
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+# Timings of the current request, None when disabled
+request_timings: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+class timed:
+    """Context manager counting the enclosed code time in the given phase of the current request, if timed."""
+
+    __slots__ = ("name", "timings")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = request_timings.get()
+        if self.timings is not None:
+            self.timings.start(self.name)
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings.stop(self.name)
+
+
+class endpoint_timed:
+    """
+    Context manager counting the enclosed endpoint time in the 'service' phase of the current request, if timed,
+    between the 'dependencies' and 'serialization' phases of its route.
+    """
+
+    __slots__ = ("timings",)
+
+    def __enter__(self):
+        self.timings = request_timings.get()
+        if self.timings is not None:
+            self.timings.stop("dependencies")
+            self.timings.start("service")
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings.stop("service")
+            self.timings.start("serialization")
+
+
+def timed_endpoint(endpoint: Callable) -> Callable:
+    """Wrap the endpoint to count its time in the 'service' phase."""
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs) -> Any:
+            with endpoint_timed():
+                return await endpoint(*args, **kwargs)
+
+    else:
+
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs) -> Any:
+            with endpoint_timed():
+                return endpoint(*args, **kwargs)
+
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """
+    Route timing its handling in three phases: 'dependencies' until its endpoint is called (request parsing and
+    validation, and dependencies), 'service' for its endpoint, then 'serialization' (response validation and
+    serialization). Nested phases, e.g. 'auth' or 'db', are timed by themselves.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            timings = request_timings.get()
+            if timings is None:
+                return await handler(request)
+            timings.start("dependencies")
+            try:
+                return await handler(request)
+            finally:
+                # Only one of them is still running, depending on whether the endpoint was called
+                timings.stop("dependencies")
+                timings.stop("serialization")
+
+        return timed_handler
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware adding the time spent by the request in each phase to the 'Server-Timing' response header
+    (auth, db, dependencies, service, serialization and total), and logging them as JSON when `SERVER_TIMING_LOG`
+    is enabled.
+
+    Does nothing unless `SERVER_TIMING` is enabled.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not get_settings().SERVER_TIMING:
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        start = time.perf_counter()
+        status = None
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.header(time.perf_counter() - start).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_timings.reset(token)
+            if get_settings().SERVER_TIMING_LOG:
+                route = scope.get("route")
+                log = {
+                    "method": scope["method"],
+                    "path": route.path_format if route else scope["path"],
+                    "status": status,
+                    "total_ms": round((time.perf_counter() - start) * 1000, 2),
+                    "timings_ms": {name: round(duration * 1000, 2) for name, duration in timings.durations.items()},
+                    "queries": timings.counts.get("db", 0),
+                }
+                logger.info(json.dumps(log))
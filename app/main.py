@@ -1,9 +1,19 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 
 from app.api.routes import root_routers, v1_routers
+from app.core.database import ReadYourWritesMiddleware
+from app.core.loop_lag import LoopLagMonitor
+from app.core.metrics import MetricsMiddleware, metrics_endpoint
+from app.core.profiling import ProfilingMiddleware
+from app.core.queries import QueryBudgetMiddleware
+from app.core.request_context import RequestScopeMiddleware
+from app.core.responses import FastJSONResponse
 from app.core.settings import get_settings
+from app.core.timing import ServerTimingMiddleware
 
 # Remove auto-generated 422 errors from redoc and swagger docs
 _openapi = FastAPI.openapi
@@ -24,12 +34,35 @@ def custom_openapi(self: FastAPI):
 
 FastAPI.openapi = custom_openapi
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the event loop lag monitor along with the application."""
+    if get_settings().LOOP_LAG_THRESHOLD is None:
+        yield
+        return
+    monitor = LoopLagMonitor(get_settings().LOOP_LAG_INTERVAL, get_settings().LOOP_LAG_THRESHOLD)
+    await monitor.start()
+    try:
+        yield
+    finally:
+        await monitor.stop()
+
+
 # Application instance
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(QueryBudgetMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestScopeMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 # Endpoints
 app.include_router(root_routers, prefix=get_settings().API_PATH)
 app.include_router(v1_routers, prefix=get_settings().API_V1_PATH)
+# Prometheus metrics, for scrapers sending the metrics token
+app.add_api_route(get_settings().METRICS_PATH, metrics_endpoint, include_in_schema=False)
 
 
 # All int validation errors now return 400 error instead of 422
@@ -1,15 +1,35 @@
 from datetime import datetime
 
 from pydantic import ValidationInfo, field_validator
-from sqlalchemy import Column, DateTime
+from sqlalchemy import Column, DateTime, Index, func, literal_column
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlmodel import Field, Relationship, SQLModel
 
 from app.models.resource_model import ResourceInDb
 from app.models.user_model import UserInDb
 
+# Constraint forbidding overlapping bookings on a same resource (PostgreSQL only)
+BOOKING_NO_OVERLAP = "booking_no_overlap"
+
 
 class BookingInDb(SQLModel, table=True):
     __tablename__ = "booking"
+    __table_args__ = (
+        ExcludeConstraint(
+            (literal_column("resource_id"), "="),
+            (func.tstzrange(literal_column("start"), literal_column('"end"')), "&&"),
+            name=BOOKING_NO_OVERLAP,
+            using="gist",
+        ).ddl_if(dialect="postgresql"),
+        # Availability checks: bookings of a resource in a slot
+        Index("ix_booking_resource_id_start_end", "resource_id", "start", "end"),
+        # User bookings list, sorted by ID (and deletion of user bookings)
+        Index("ix_booking_owner_id_id", "owner_id", "id"),
+        # Substring search on title (PostgreSQL pg_trgm only)
+        Index(
+            "ix_booking_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
     id: int | None = Field(description="Resource ID", default=None, primary_key=True)
     title: str = Field(description="Booking subject", nullable=False)
     start: datetime = Field(
@@ -18,10 +38,10 @@ class BookingInDb(SQLModel, table=True):
     end: datetime = Field(
         description="Booking end date & time", sa_column=Column(DateTime(timezone=True), nullable=False)
     )
-    owner_id: int = Field(nullable=False, foreign_key="user.id")
+    owner_id: int = Field(nullable=False, foreign_key="user.id", ondelete="CASCADE")
     owner: UserInDb = Relationship(back_populates="bookings")
 
-    resource_id: int = Field(nullable=False, foreign_key="resource.id")
+    resource_id: int = Field(nullable=False, foreign_key="resource.id", ondelete="CASCADE")
     resource: ResourceInDb = Relationship(back_populates="bookings")
 
     @field_validator("start")
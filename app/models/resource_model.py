@@ -1,7 +1,7 @@
 import enum
 from enum import auto
 
-from sqlalchemy import CheckConstraint, Column, Enum
+from sqlalchemy import CheckConstraint, Column, Enum, Index
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -16,6 +16,20 @@ class RoomType(enum.StrEnum):
 
 class ResourceInDb(SQLModel, table=True):
     __tablename__ = "resource"
+    __table_args__ = (
+        # Search of available resources by type and capacity
+        Index("ix_resource_room_type_capacity", "room_type", "capacity"),
+        # Substring search on name and location (PostgreSQL pg_trgm only)
+        Index("ix_resource_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(
+            dialect="postgresql"
+        ),
+        Index(
+            "ix_resource_location_trgm",
+            "location",
+            postgresql_using="gin",
+            postgresql_ops={"location": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
     id: int | None = Field(description="Resource ID", default=None, primary_key=True)
     name: str = Field(description="Resource name", nullable=False, unique=True, index=True)
     location: str | None = Field(description="Resource location", nullable=True)
@@ -25,4 +39,7 @@ class ResourceInDb(SQLModel, table=True):
     room_type: RoomType = Field(
         description="Resource type", default=RoomType.AUDITORIUM, sa_column=Column(Enum(RoomType), nullable=False)
     )
-    bookings: list["BookingInDb"] = Relationship(back_populates="resource", cascade_delete=True)  # type: ignore  # noqa
+    # Bookings are deleted by the database (ON DELETE CASCADE), without loading them
+    bookings: list["BookingInDb"] = Relationship(  # type: ignore  # noqa
+        back_populates="resource", cascade_delete=True, passive_deletes=True
+    )
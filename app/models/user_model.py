@@ -18,4 +18,7 @@ class UserInDb(SQLModel, table=True):
     role: Role = Field(description="User role", default=Role.USER, sa_column=Column(Enum(Role), nullable=False))
     password: str = Field(nullable=False)
 
-    bookings: list["BookingInDb"] = Relationship(back_populates="owner", cascade_delete=True)  # type: ignore  # noqa
+    # Bookings are deleted by the database (ON DELETE CASCADE), without loading them
+    bookings: list["BookingInDb"] = Relationship(  # type: ignore  # noqa
+        back_populates="owner", cascade_delete=True, passive_deletes=True
+    )
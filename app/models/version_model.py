@@ -0,0 +1,7 @@
+from sqlmodel import Field, SQLModel
+
+
+class VersionInDb(SQLModel, table=True):
+    __tablename__ = "version"
+    key: str = Field(description="Versioned data key", primary_key=True)
+    value: int = Field(description="Data version, incremented on each change", default=0, nullable=False)
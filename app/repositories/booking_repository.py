@@ -1,83 +1,179 @@
+from collections.abc import AsyncIterator
 from datetime import datetime
+from typing import Sequence
 
 from pydantic import ValidationError
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from sqlmodel import and_, or_, select
+from sqlalchemy import RowMapping, delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sqlmodel import select
+from sqlmodel.sql.expression import Select
 
-from app.core.database import DBSession
-from app.core.exceptions import DuplicateException, NotFoundException, ValidationException
-from app.models.booking_model import BookingInDb
-from app.repositories.repository import AbstractRepository
+from app.core.database import DBReadSession, DBSession
+from app.core.exceptions import DuplicateException, NotAvailableException, NotFoundException, ValidationException
+from app.models.booking_model import BOOKING_NO_OVERLAP, BookingInDb
+from app.repositories.repository import AbstractRepository, schema_columns
+from app.repositories.search import contains, relevance, sort_by_relevance
+from app.repositories.version_repository import bump_versions, owner_bookings
 from app.schema.booking_schema import BookingWithId, BookingWithOwner
 
 
 class BookingRepository(AbstractRepository):
-    def __init__(self, db: DBSession):
+    def __init__(self, db: DBSession, read_db: DBReadSession):
         self.db = db
+        # Session for read-only queries, possibly on a read replica
+        self.read_db = read_db
 
-    async def create(self, booking: BookingWithOwner) -> BookingWithId:
+    def validate(self, booking: BookingWithOwner) -> BookingInDb:
         try:
-            booking_db = BookingInDb.model_validate(booking)
+            return BookingInDb.model_validate(booking)
         except ValidationError:
             raise ValidationException()
-        self.db.add(booking_db)
+
+    async def create(self, booking: BookingWithOwner) -> BookingWithId:
+        query = insert(BookingInDb).values(self.validate(booking).model_dump(exclude={"id"})).returning(BookingInDb)
         try:
+            booking_db = (await self.db.execute(query)).scalar_one()
+            await self._check_no_overlap([booking_db.id])
+            await bump_versions(self.db, owner_bookings(booking_db.owner_id))
             await self.db.commit()
-        except IntegrityError:
+        except IntegrityError as e:
+            # The failed transaction would otherwise be left open on the session
+            await self.db.rollback()
+            if BOOKING_NO_OVERLAP in str(e.orig):
+                raise NotAvailableException()
             raise DuplicateException()
-        await self.db.refresh(booking_db)
         return booking_db
 
-    async def delete(self, id: int):
-        booking_db = await self.db.get(BookingInDb, id)
-        if not booking_db:
-            raise NotFoundException()
+    async def create_many(self, bookings: list[BookingInDb]) -> list[BookingWithId]:
+        """Insert the given validated bookings in a single transaction and return them in the same order."""
+        query = insert(BookingInDb).returning(BookingInDb, sort_by_parameter_order=True)
         try:
-            await self.db.delete(booking_db)
-        except SQLAlchemyError:
+            bookings_db = (await self.db.scalars(query, [b.model_dump(exclude={"id"}) for b in bookings])).all()
+            await self._check_no_overlap([b.id for b in bookings_db])
+            await bump_versions(self.db, *(owner_bookings(b.owner_id) for b in bookings_db))
+            await self.db.commit()
+        except IntegrityError as e:
+            await self.db.rollback()
+            if BOOKING_NO_OVERLAP in str(e.orig):
+                raise NotAvailableException()
+            raise ValidationException()
+        return bookings_db
+
+    async def _check_no_overlap(self, ids: list[int]):
+        """
+        Raise if the given written bookings overlap another booking of their resource, on databases without the
+        `BOOKING_NO_OVERLAP` constraint (only created on PostgreSQL). Run after the write, in its transaction: the
+        database write lock then keeps other workers from booking the same slot meanwhile.
+        """
+        if self.db.bind.dialect.name == "postgresql":
+            return
+        other = aliased(BookingInDb)
+        query = (
+            select(BookingInDb.id)
+            .join(other, (other.resource_id == BookingInDb.resource_id) & (other.id != BookingInDb.id))
+            .where(BookingInDb.id.in_(ids))
+            .where(other.start < BookingInDb.end)
+            .where(other.end > BookingInDb.start)
+            .limit(1)
+        )
+        if (await self.db.execute(query)).first():
+            await self.db.rollback()
+            raise NotAvailableException()
+
+    async def delete(self, id: int):
+        query = delete(BookingInDb).where(BookingInDb.id == id).returning(BookingInDb.owner_id)
+        owner_id = (await self.db.execute(query)).scalar_one_or_none()
+        if owner_id is None:
             raise NotFoundException()
+        await bump_versions(self.db, owner_bookings(owner_id))
         await self.db.commit()
 
-    async def get(self, id: int) -> BookingWithId:
-        booking_db = await self.db.get(BookingInDb, id)
+    async def get(self, id: int, primary: bool = False) -> BookingWithId:
+        """Return the booking, from the primary database when used by a write (a replica may lag behind)."""
+        booking_db = await (self.db if primary else self.read_db).get(BookingInDb, id)
         if not booking_db:
             raise NotFoundException()
         return booking_db
 
     async def get_list(
-        self, offset: int, limit: int, owner_id: int = None, all: bool = False, search: str = None
-    ) -> list[BookingWithId]:
-        query = select(BookingInDb)
+        self,
+        offset: int,
+        limit: int,
+        owner_id: int = None,
+        all: bool = False,
+        search: str = None,
+        after_id: int = None,
+        fields: tuple[str, ...] = None,
+        after_rank: float = None,
+    ) -> Sequence[RowMapping]:
+        query = select(*schema_columns(BookingInDb, BookingWithId, fields))
         if not all:
             query = query.where(BookingInDb.owner_id == owner_id)
+        rank = None
         if search:
-            query = query.where(BookingInDb.title.icontains(search))
-        return (await self.db.execute(query.offset(offset).limit(limit))).scalars().all()
+            query = query.where(contains(BookingInDb.title, search))
+            rank = relevance(self.read_db.bind.dialect.name, (BookingInDb.title, search))
+        query = sort_by_relevance(query, BookingInDb.id, rank, after_id, after_rank)
+        return (await self.read_db.execute(query.offset(offset).limit(limit))).mappings().all()
 
-    async def update(self, id: int, booking: BookingWithOwner) -> BookingWithId:
-        booking_db = await self.db.get(BookingInDb, id)
-        if not booking_db:
-            raise NotFoundException()
-        for key, value in booking.model_dump().items():
-            setattr(booking_db, key, value)
+    async def update(self, id: int, booking: BookingWithOwner, previous_owner_id: int = None) -> BookingWithId:
+        """Update the booking, `previous_owner_id` being its owner before the update when it changes."""
+        query = update(BookingInDb).where(BookingInDb.id == id).values(booking.model_dump()).returning(BookingInDb)
         try:
+            booking_db = (await self.db.execute(query)).scalar_one_or_none()
+            if booking_db:
+                await self._check_no_overlap([booking_db.id])
+                owners = {booking_db.owner_id, previous_owner_id or booking_db.owner_id}
+                await bump_versions(self.db, *map(owner_bookings, owners))
             await self.db.commit()
-        except IntegrityError:
+        except IntegrityError as e:
+            await self.db.rollback()
+            if BOOKING_NO_OVERLAP in str(e.orig):
+                raise NotAvailableException()
             raise ValidationException()
-        await self.db.refresh(booking_db)
+        if not booking_db:
+            raise NotFoundException()
         return booking_db
 
     async def get_resource_bookings_in_slot(
         self, resource_id: int, start: datetime, end: datetime
     ) -> list[BookingWithId]:
-        query = (
+        return (await self.read_db.execute(self._resource_slot_query(resource_id, start, end))).scalars().all()
+
+    async def stream_resource_bookings_in_slot(
+        self, resource_id: int, start: datetime, end: datetime
+    ) -> AsyncIterator[tuple[datetime, datetime]]:
+        """Yield (start, end) of the resource bookings overlapping the slot by start date, without loading them all."""
+        query = self._resource_slot_query(resource_id, start, end).with_only_columns(
+            BookingInDb.start, BookingInDb.end
+        )
+        result = await self.read_db.stream(query.order_by(BookingInDb.start))
+        try:
+            async for booking_start, booking_end in result:
+                yield booking_start, booking_end
+        finally:
+            # Also when the caller stops early, not to keep the cursor open until the session closes
+            await result.close()
+
+    def _resource_slot_query(self, resource_id: int, start: datetime, end: datetime) -> Select:
+        return (
             select(BookingInDb)
             .where(BookingInDb.resource_id == resource_id)
-            .where(
-                or_(
-                    and_(BookingInDb.start <= start, start < BookingInDb.end),
-                    and_(BookingInDb.start < end, end <= BookingInDb.end),
-                )
-            )
+            .where(BookingInDb.start < end.astimezone())
+            .where(BookingInDb.end > start.astimezone())
+        )
+
+    async def get_resources_schedules(
+        self, resource_ids: list[int], since: datetime
+    ) -> dict[int, list[tuple[int, datetime, datetime]]]:
+        """Return (id, start, end) of the bookings ending after the given date, grouped by resource."""
+        query = (
+            select(BookingInDb.resource_id, BookingInDb.id, BookingInDb.start, BookingInDb.end)
+            .where(BookingInDb.resource_id.in_(resource_ids))
+            .where(BookingInDb.end > since)
         )
-        return (await self.db.execute(query)).scalars().all()
+        schedules = {}
+        for resource_id, id, start, end in await self.db.execute(query):
+            schedules.setdefault(resource_id, []).append((id, start, end))
+        return schedules
@@ -1,5 +1,13 @@
 from abc import ABC, abstractmethod
 
+from pydantic import BaseModel
+from sqlmodel import SQLModel
+
+
+def schema_columns(model: type[SQLModel], schema: type[BaseModel], fields: tuple[str, ...] = None) -> list:
+    """Return the model columns of the schema fields (or of the given ones), to fetch rows instead of ORM objects."""
+    return [getattr(model, name) for name in fields or schema.model_fields]
+
 
 class AbstractRepository(ABC):
     @abstractmethod
@@ -1,64 +1,109 @@
+from datetime import datetime
+from typing import Sequence
+
 from pydantic import ValidationError
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy import RowMapping, delete, insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 
-from app.core.database import DBSession
+from app.core.database import DBReadSession, DBSession
 from app.core.exceptions import DuplicateException, NotFoundException, ValidationException
-from app.models.resource_model import ResourceInDb
-from app.repositories.repository import AbstractRepository
+from app.models.booking_model import BookingInDb
+from app.models.resource_model import ResourceInDb, RoomType
+from app.repositories.repository import AbstractRepository, schema_columns
+from app.repositories.search import contains, relevance, sort_by_relevance
+from app.repositories.version_repository import RESOURCES, bump_versions
 from app.schema.resource_schema import ResourceBase, ResourceWithId
 
 
 class ResourceRepository(AbstractRepository):
-    def __init__(self, db: DBSession):
+    def __init__(self, db: DBSession, read_db: DBReadSession):
         self.db = db
+        # Session for read-only queries, possibly on a read replica
+        self.read_db = read_db
 
     async def create(self, resource: ResourceBase) -> ResourceWithId:
         try:
             resource_db = ResourceInDb.model_validate(resource)
         except ValidationError:
             raise ValidationException()
-        self.db.add(resource_db)
+        query = insert(ResourceInDb).values(resource_db.model_dump(exclude={"id"})).returning(ResourceInDb)
         try:
+            resource_db = (await self.db.execute(query)).scalar_one()
+            await bump_versions(self.db, RESOURCES)
             await self.db.commit()
         except IntegrityError:
+            await self.db.rollback()
             raise DuplicateException()
-        await self.db.refresh(resource_db)
         return resource_db
 
     async def delete(self, id: int):
-        resource_db = await self.db.get(ResourceInDb, id)
-        if not resource_db:
-            raise NotFoundException()
-        try:
-            await self.db.delete(resource_db)
-        except SQLAlchemyError:
+        query = delete(ResourceInDb).where(ResourceInDb.id == id).returning(ResourceInDb.id)
+        if (await self.db.execute(query)).scalar_one_or_none() is None:
             raise NotFoundException()
+        # Its bookings are deleted too: bookings lists ETags include the resources version
+        await bump_versions(self.db, RESOURCES)
         await self.db.commit()
 
     async def get(self, id: int) -> ResourceWithId:
-        resource_db = await self.db.get(ResourceInDb, id)
+        resource_db = await self.read_db.get(ResourceInDb, id)
         if not resource_db:
             raise NotFoundException()
         return resource_db
 
-    async def get_list(self, offset: int, limit: int, name: str = None, location: str = None) -> list[ResourceWithId]:
-        query = select(ResourceInDb)
+    async def get_existing_ids(self, ids: list[int]) -> set[int]:
+        query = select(ResourceInDb.id).where(ResourceInDb.id.in_(ids))
+        return set((await self.db.execute(query)).scalars().all())
+
+    async def get_list(
+        self,
+        offset: int,
+        limit: int,
+        name: str = None,
+        location: str = None,
+        room_type: RoomType = None,
+        min_capacity: int = None,
+        free_start: datetime = None,
+        free_end: datetime = None,
+        after_id: int = None,
+        fields: tuple[str, ...] = None,
+        after_rank: float = None,
+    ) -> Sequence[RowMapping]:
+        query = select(*schema_columns(ResourceInDb, ResourceWithId, fields))
+        searches = []
         if name:
-            query = query.where(ResourceInDb.name.icontains(name))
+            query = query.where(contains(ResourceInDb.name, name))
+            searches.append((ResourceInDb.name, name))
         if location:
-            query = query.where(ResourceInDb.location.icontains(location))
-        return (await self.db.execute(query.offset(offset).limit(limit))).scalars().all()
+            query = query.where(contains(ResourceInDb.location, location))
+            searches.append((ResourceInDb.location, location))
+        if room_type:
+            query = query.where(ResourceInDb.room_type == room_type)
+        if min_capacity:
+            query = query.where(ResourceInDb.capacity >= min_capacity)
+        if free_start and free_end:
+            # Anti-join: no booking of the resource overlaps the slot
+            overlapping = (
+                select(BookingInDb.id)
+                .where(BookingInDb.resource_id == ResourceInDb.id)
+                .where(BookingInDb.start < free_end)
+                .where(BookingInDb.end > free_start)
+            )
+            query = query.where(~overlapping.exists())
+        rank = relevance(self.read_db.bind.dialect.name, *searches)
+        query = sort_by_relevance(query, ResourceInDb.id, rank, after_id, after_rank)
+        return (await self.read_db.execute(query.offset(offset).limit(limit))).mappings().all()
 
     async def update(self, id: int, resource: ResourceBase) -> ResourceWithId:
-        resource_db = await self.db.get(ResourceInDb, id)
-        if not resource_db:
-            raise NotFoundException()
-        for key, value in resource.model_dump().items():
-            setattr(resource_db, key, value)
+        query = update(ResourceInDb).where(ResourceInDb.id == id).values(resource.model_dump()).returning(ResourceInDb)
         try:
+            resource_db = (await self.db.execute(query)).scalar_one_or_none()
+            if resource_db:
+                await bump_versions(self.db, RESOURCES)
             await self.db.commit()
         except IntegrityError:
+            await self.db.rollback()
             raise ValidationException()
-        await self.db.refresh(resource_db)
+        if not resource_db:
+            raise NotFoundException()
         return resource_db
@@ -0,0 +1,42 @@
+import operator
+from functools import reduce
+
+from sqlalchemy import ColumnElement, and_, func, or_
+from sqlmodel.sql.expression import Select
+
+from app.core.exceptions import ValidationException
+
+
+def contains(column: ColumnElement, term: str) -> ColumnElement:
+    """Case insensitive substring filter, served by the trigram GIN indexes on PostgreSQL."""
+    return column.icontains(term, autoescape=True)
+
+
+def relevance(dialect: str, *searches: tuple[ColumnElement, str]) -> ColumnElement | None:
+    """
+    Return the relevance of rows for the given (column, term) searches, from the pg_trgm word similarity.
+
+    None on other databases or without search: results are then simply sorted by ID.
+    """
+    if dialect != "postgresql" or not searches:
+        return None
+    return reduce(operator.add, (func.word_similarity(term, column) for column, term in searches))
+
+
+def sort_by_relevance(
+    query: Select, id_column: ColumnElement, rank: ColumnElement | None, after_id: int = None, after_rank: float = None
+) -> Select:
+    """
+    Sort the query by decreasing relevance (when ranked) then by ID, starting after the given cursor position.
+
+    The rank is returned in a 'rank' column so the next page cursor can include it.
+    """
+    if rank is None:
+        query = query.order_by(id_column)
+        return query if after_id is None else query.where(id_column > after_id)
+    query = query.add_columns(rank.label("rank")).order_by(rank.desc(), id_column)
+    if after_id is None:
+        return query
+    if after_rank is None:
+        raise ValidationException("Invalid cursor")
+    return query.where(or_(rank < after_rank, and_(rank == after_rank, id_column > after_id)))
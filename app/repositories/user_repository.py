@@ -1,55 +1,66 @@
+from typing import Sequence
+
 from pydantic import ValidationError
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy import RowMapping, delete, insert
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 
-from app.core.database import DBSession
+from app.core.cache import get_cache
+from app.core.database import DBReadSession, DBSession
 from app.core.exceptions import DuplicateException, NotFoundException, ValidationException
 from app.models.user_model import UserInDb
-from app.repositories.repository import AbstractRepository
+from app.repositories.repository import AbstractRepository, schema_columns
+from app.repositories.version_repository import bump_versions, owner_bookings
 from app.schema.user_schema import UserWithId, UserWithPwd
 
 
 class UserRepository(AbstractRepository):
-    def __init__(self, db: DBSession):
+    def __init__(self, db: DBSession, read_db: DBReadSession):
         self.db = db
+        # Session for read-only queries, possibly on a read replica
+        self.read_db = read_db
 
     async def create(self, user: UserWithPwd) -> UserWithId:
         try:
             user_db = UserInDb.model_validate(user)
         except ValidationError:
             raise ValidationException()
-        self.db.add(user_db)
+        query = insert(UserInDb).values(user_db.model_dump(exclude={"id"})).returning(UserInDb)
         try:
+            user_db = (await self.db.execute(query)).scalar_one()
             await self.db.commit()
         except IntegrityError:
+            await self.db.rollback()
             raise DuplicateException()
-        await self.db.refresh(user_db)
         return user_db
 
     async def delete(self, id: int):
-        user_db = await self.db.get(UserInDb, id)
-        if not user_db:
-            raise NotFoundException()
-        try:
-            await self.db.delete(user_db)
-        except SQLAlchemyError:
+        query = delete(UserInDb).where(UserInDb.id == id).returning(UserInDb.email)
+        email = (await self.db.execute(query)).scalar_one_or_none()
+        if email is None:
             raise NotFoundException()
+        # Its bookings are deleted too
+        await bump_versions(self.db, owner_bookings(id))
         await self.db.commit()
+        get_cache("users").delete(email)
 
     async def get(self, id: int) -> UserWithId:
-        user_db = await self.db.get(UserInDb, id)
+        user_db = await self.read_db.get(UserInDb, id)
         if not user_db:
             raise NotFoundException()
         return user_db
 
     async def get_with_username(self, username: str) -> UserWithId:
-        user_db = (await self.db.execute(select(UserInDb).where(UserInDb.email == username))).scalars().first()
+        user_db = (await self.read_db.execute(select(UserInDb).where(UserInDb.email == username))).scalars().first()
         if not user_db:
             raise NotFoundException()
         return user_db
 
-    async def get_list(self, offset: int, limit: int) -> list[UserWithId]:
-        return (await self.db.execute(select(UserInDb).offset(offset).limit(limit))).scalars().all()
+    async def get_list(self, offset: int, limit: int, after_id: int = None) -> Sequence[RowMapping]:
+        query = select(*schema_columns(UserInDb, UserWithId)).order_by(UserInDb.id)
+        if after_id is not None:
+            query = query.where(UserInDb.id > after_id)
+        return (await self.read_db.execute(query.offset(offset).limit(limit))).mappings().all()
 
     def update(self, id: int, object):
         """We don't allow user modification."""
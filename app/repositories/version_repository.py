@@ -0,0 +1,58 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import func, select
+
+from app.core.database import DBReadSession
+from app.models.version_model import VersionInDb
+
+# Versioned data keys
+BOOKINGS = "bookings"
+RESOURCES = "resources"
+
+
+def owner_bookings(owner_id: int) -> str:
+    return f"{BOOKINGS}:owner:{owner_id}"
+
+
+# Bookings of all owners: no single key is bumped by every booking write, so that writes never wait for its lock
+ALL_BOOKINGS = owner_bookings("*")
+
+
+async def bump_versions(db: AsyncSession, *keys: str):
+    """
+    Increment the version of the given keys.
+
+    To call in the transaction of the write changing the data, just before its commit, so versions never get ahead
+    of or behind the data they describe.
+    """
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    # Sorted to always lock the rows in the same order
+    query = insert(VersionInDb).values([{"key": key, "value": 1} for key in sorted(set(keys))])
+    query = query.on_conflict_do_update(index_elements=["key"], set_={"value": VersionInDb.value + 1})
+    await db.execute(query)
+
+
+class VersionRepository:
+    """Change versions of the data, used to answer conditional requests without loading the data."""
+
+    def __init__(self, read_db: DBReadSession):
+        self.read_db = read_db
+
+    async def get(self, *keys: str) -> list[int]:
+        """
+        Return the versions of the given keys, in the same order (0 when never changed).
+
+        A key ending with '*' stands for all the keys it prefixes: its version is the sum of theirs, which increases
+        whenever one of them does.
+        """
+        versions = {}
+        if exact_keys := [key for key in keys if not key.endswith("*")]:
+            query = select(VersionInDb.key, VersionInDb.value).where(VersionInDb.key.in_(exact_keys))
+            versions.update((await self.read_db.execute(query)).all())
+        for key in keys:
+            if key.endswith("*"):
+                query = select(func.sum(VersionInDb.value)).where(
+                    VersionInDb.key.startswith(key[:-1], autoescape=True)
+                )
+                versions[key] = (await self.read_db.execute(query)).scalar_one()
+        return [versions.get(key) or 0 for key in keys]
@@ -1,6 +1,8 @@
+import enum
 from datetime import datetime
+from enum import auto
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 
 class BookingBase(BaseModel):
@@ -19,3 +21,20 @@ class BookingWithOwner(BookingBase):
 
 class BookingWithId(BookingWithOwner):
     id: int
+
+
+# List endpoints rows validator & serializer, built once
+booking_list_adapter = TypeAdapter(list[BookingWithId])
+
+
+class BookingBatchStatus(enum.StrEnum):
+    CREATED = auto()
+    INVALID = auto()
+    NOT_AVAILABLE = auto()
+
+
+class BookingBatchItem(BaseModel):
+    index: int
+    status: BookingBatchStatus
+    booking: BookingWithId | None = None
+    detail: str | None = None
@@ -1,4 +1,6 @@
-from pydantic import BaseModel, NonNegativeInt, field_validator
+from datetime import datetime
+
+from pydantic import BaseModel, NonNegativeInt, TypeAdapter, field_validator
 
 from app.models.resource_model import RoomType
 
@@ -20,3 +22,12 @@ class ResourceBase(BaseModel):
 
 class ResourceWithId(ResourceBase):
     id: int
+
+
+# List endpoints rows validator & serializer, built once
+resource_list_adapter = TypeAdapter(list[ResourceWithId])
+
+
+class FreeSlot(BaseModel):
+    start: datetime
+    end: datetime
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, TypeAdapter
 
 from app.models.user_model import Role
 
@@ -19,3 +19,7 @@ class UserWithPwd(UserBase):
 
 class UserWithId(UserBase):
     id: int
+
+
+# List endpoints rows validator & serializer, built once
+user_list_adapter = TypeAdapter(list[UserWithId])
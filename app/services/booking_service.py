@@ -1,12 +1,29 @@
+from contextlib import AsyncExitStack
 from datetime import datetime
+from typing import Sequence
 
 from fastapi import Depends
+from sqlalchemy import RowMapping
 
-from app.core.exceptions import NotAvailableException, NotFoundException, ValidationException
+from app.core.availability import ResourceSchedule, availability_index
+from app.core.exceptions import (
+    DuplicateException,
+    NotAvailableException,
+    NotFoundException,
+    ValidationException,
+)
+from app.core.metrics import booking_not_available
+from app.core.settings import get_settings
 from app.models.user_model import Role
 from app.repositories.booking_repository import BookingRepository
 from app.repositories.resource_repository import ResourceRepository
-from app.schema.booking_schema import BookingBase, BookingWithId, BookingWithOwner
+from app.schema.booking_schema import (
+    BookingBase,
+    BookingBatchItem,
+    BookingBatchStatus,
+    BookingWithId,
+    BookingWithOwner,
+)
 from app.schema.user_schema import UserWithId
 from app.services.service import AbstractService
 
@@ -20,13 +37,100 @@ class BookingService(AbstractService):
 
     async def create(self, booking: BookingBase, current_user: UserWithId = None) -> BookingWithId:
         booking = BookingWithOwner(**booking.model_dump(), owner_id=current_user.id)
-        # Check if resource is available
-        if not await self.is_resource_available(booking.resource_id, booking.start, booking.end):
-            raise NotAvailableException()
-        return await self.booking_repository.create(booking)
+        async with availability_index.lock(booking.resource_id):
+            # Check if resource is available
+            if not await self.is_resource_available(booking.resource_id, booking.start, booking.end):
+                booking_not_available.inc("create")
+                raise NotAvailableException()
+            try:
+                booking_db = await self.booking_repository.create(booking)
+            except (NotAvailableException, DuplicateException) as e:
+                # Rejected by the database: booked meanwhile by another worker (the schedule is outdated), or unknown
+                # resource (its empty schedule is not worth keeping)
+                if isinstance(e, NotAvailableException):
+                    booking_not_available.inc("create")
+                availability_index.invalidate(booking.resource_id)
+                raise
+            availability_index.add(booking_db.resource_id, booking_db.id, booking_db.start, booking_db.end)
+        return booking_db
+
+    async def create_many(
+        self, bookings: list[BookingBase], current_user: UserWithId = None
+    ) -> list[BookingBatchItem]:
+        """
+        Create all the available and valid bookings in a single transaction and return the status of each one.
+
+        When the database rejects the transaction, e.g. a slot was booked meanwhile by another worker, the bookings
+        are created one by one instead, so only the rejected ones get a failed status.
+        """
+        if len(bookings) > get_settings().BOOKING_BATCH_MAX_SIZE:
+            raise ValidationException(f"Cannot create more than {get_settings().BOOKING_BATCH_MAX_SIZE} bookings")
+        results = [BookingBatchItem(index=index, status=BookingBatchStatus.CREATED) for index in range(len(bookings))]
+        resource_ids = list({booking.resource_id for booking in bookings})
+        existing_ids = await self.resource_repository.get_existing_ids(resource_ids)
+
+        async with AsyncExitStack() as stack:
+            # Always lock resources in the same order so concurrent batches cannot deadlock
+            for resource_id in sorted(existing_ids):
+                await stack.enter_async_context(availability_index.lock(resource_id))
+            # Resources whose schedule is loaded from the database now, and so cannot be outdated
+            reloaded = {resource_id for resource_id in existing_ids if availability_index.get(resource_id) is None}
+            schedules = await self.get_schedules(existing_ids)
+            # Bookings of this batch accepted so far, to check them against each other
+            accepted = {resource_id: ResourceSchedule([]) for resource_id in existing_ids}
+            to_create = []
+            for item, booking in zip(results, bookings):
+                if booking.resource_id not in existing_ids:
+                    item.status, item.detail = BookingBatchStatus.INVALID, "Resource not found"
+                    continue
+                try:
+                    booking_db = self.booking_repository.validate(
+                        BookingWithOwner(**booking.model_dump(), owner_id=current_user.id)
+                    )
+                except ValidationException as e:
+                    item.status, item.detail = BookingBatchStatus.INVALID, e.detail
+                    continue
+                schedule, batch_schedule = schedules[booking.resource_id], accepted[booking.resource_id]
+                available = schedule.is_available(booking.start, booking.end)
+                if not available and booking.resource_id not in reloaded:
+                    # The conflicting booking may be cancelled or moved by another worker since the schedule loading
+                    reloaded.add(booking.resource_id)
+                    schedules.update(await self.load_schedules([booking.resource_id]))
+                    schedule = schedules[booking.resource_id]
+                    available = schedule.is_available(booking.start, booking.end)
+                if not available or not batch_schedule.is_available(booking.start, booking.end):
+                    booking_not_available.inc("batch")
+                    item.status, item.detail = BookingBatchStatus.NOT_AVAILABLE, NotAvailableException().detail
+                    continue
+                batch_schedule.add(item.index, booking.start, booking.end)
+                to_create.append((item, booking_db))
+
+            created = []
+            try:
+                if to_create:
+                    bookings_db = await self.booking_repository.create_many(
+                        [booking_db for _, booking_db in to_create]
+                    )
+                    created = [(item, booking_db) for (item, _), booking_db in zip(to_create, bookings_db)]
+            except (NotAvailableException, ValidationException):
+                # The schedules are outdated
+                for resource_id in existing_ids:
+                    availability_index.invalidate(resource_id)
+                for item, booking_db in to_create:
+                    try:
+                        created.append((item, (await self.booking_repository.create_many([booking_db]))[0]))
+                    except NotAvailableException as e:
+                        booking_not_available.inc("batch")
+                        item.status, item.detail = BookingBatchStatus.NOT_AVAILABLE, e.detail
+                    except ValidationException as e:
+                        item.status, item.detail = BookingBatchStatus.INVALID, e.detail
+            for item, booking_db in created:
+                availability_index.add(booking_db.resource_id, booking_db.id, booking_db.start, booking_db.end)
+                item.booking = BookingWithId.model_validate(booking_db)
+        return results
 
     async def delete(self, id: int, current_user: UserWithId = None):
-        booking = await self.booking_repository.get(id)
+        booking = await self.booking_repository.get(id, primary=True)
         # If user is not admin and try to access a booking that is not his own
         if current_user.role.value < Role.ADMIN.value and booking.owner_id != current_user.id:
             raise NotFoundException()
@@ -34,6 +138,7 @@ class BookingService(AbstractService):
         if booking.end.astimezone() <= datetime.now().astimezone():
             raise ValidationException()
         await self.booking_repository.delete(id)
+        availability_index.remove(booking.resource_id, id, booking.start)
 
     async def get(self, id: int, current_user: UserWithId = None) -> BookingWithId:
         booking = await self.booking_repository.get(id)
@@ -43,28 +148,70 @@ class BookingService(AbstractService):
         return booking
 
     async def get_list(
-        self, offset: int, limit: int, current_user: UserWithId = None, all: bool = False, search: str = None
-    ) -> list[BookingWithId]:
-        return await self.booking_repository.get_list(offset, limit, current_user.id, all, search)
+        self,
+        offset: int,
+        limit: int,
+        current_user: UserWithId = None,
+        all: bool = False,
+        search: str = None,
+        after_id: int = None,
+        fields: tuple[str, ...] = None,
+        after_rank: float = None,
+    ) -> Sequence[RowMapping]:
+        return await self.booking_repository.get_list(
+            offset, limit, current_user.id, all, search, after_id, fields, after_rank
+        )
 
     async def update(self, id: int, booking: BookingBase, current_user: UserWithId = None) -> BookingWithId:
-        booking_db = await self.booking_repository.get(id)
+        booking_db = await self.booking_repository.get(id, primary=True)
         # If user is not admin and try to access a booking that is not his own
         if current_user.role.value < Role.ADMIN.value and booking_db.owner_id != current_user.id:
             raise NotFoundException()
         # Can update future booking but not current or past ones
         if booking_db.end.astimezone() < datetime.now().astimezone():
             raise ValidationException()
-        # Check if resource is available: get all bookings in the given slot except the current one
-        bookings = await self.booking_repository.get_resource_bookings_in_slot(
-            booking.resource_id, booking.start, booking.end
-        )
-        if id in [b.id for b in bookings] and len(bookings) > 1:
-            raise NotAvailableException()
+        previous_resource_id, previous_start = booking_db.resource_id, booking_db.start
+        async with availability_index.lock(booking.resource_id):
+            # Check if resource is available: ignore the booking being updated
+            if not await self.is_resource_available(booking.resource_id, booking.start, booking.end, exclude_id=id):
+                booking_not_available.inc("update")
+                raise NotAvailableException()
+            booking_data = BookingWithOwner(**booking.model_dump(), owner_id=current_user.id)
+            try:
+                booking_db = await self.booking_repository.update(
+                    id, booking_data, previous_owner_id=booking_db.owner_id
+                )
+            except (NotAvailableException, ValidationException) as e:
+                # Same as for creates
+                if isinstance(e, NotAvailableException):
+                    booking_not_available.inc("update")
+                availability_index.invalidate(booking.resource_id)
+                raise
+            availability_index.remove(previous_resource_id, id, previous_start)
+            availability_index.add(booking_db.resource_id, id, booking_db.start, booking_db.end)
+        return booking_db
+
+    async def is_resource_available(self, id: int, start: datetime, end: datetime, exclude_id: int = None) -> bool:
+        """
+        Check the slot against the indexed schedule of the resource, then against the database on a conflict: the
+        database stays the source of truth, the conflicting booking may be cancelled or moved by another worker since
+        the schedule loading.
+        """
+        schedule = availability_index.get(id)
+        if schedule is None or not schedule.is_available(start, end, exclude_id):
+            schedule = (await self.load_schedules([id]))[id]
+        return schedule.is_available(start, end, exclude_id)
 
-        booking_data = BookingWithOwner(**booking.model_dump(), owner_id=current_user.id)
-        return await self.booking_repository.update(id, booking_data)
+    async def get_schedules(self, resource_ids: list[int]) -> dict[int, ResourceSchedule]:
+        """Return the schedules of the given resources, loading the missing ones from the database in one query."""
+        schedules = {id: availability_index.get(id) for id in resource_ids}
+        missing_ids = [id for id, schedule in schedules.items() if schedule is None]
+        if missing_ids:
+            schedules.update(await self.load_schedules(missing_ids))
+        return schedules
 
-    async def is_resource_available(self, id: int, start: datetime, end: datetime) -> bool:
-        bookings = await self.booking_repository.get_resource_bookings_in_slot(id, start, end)
-        return False if bookings else True
+    async def load_schedules(self, resource_ids: list[int]) -> dict[int, ResourceSchedule]:
+        """Load the schedules of the given resources from the database in one query, replacing the indexed ones."""
+        # Past bookings cannot conflict with new ones, only load the current and future ones
+        bookings = await self.booking_repository.get_resources_schedules(resource_ids, datetime.now().astimezone())
+        return {id: availability_index.load(id, bookings.get(id, [])) for id in resource_ids}
@@ -1,8 +1,16 @@
+from datetime import datetime, timedelta
+from typing import Sequence
+
 from fastapi import Depends
+from sqlalchemy import RowMapping
 
+from app.core.availability import availability_index
+from app.core.cache import get_cache
+from app.core.exceptions import ValidationException
+from app.models.resource_model import RoomType
 from app.repositories.booking_repository import BookingRepository
 from app.repositories.resource_repository import ResourceRepository
-from app.schema.resource_schema import ResourceBase, ResourceWithId
+from app.schema.resource_schema import FreeSlot, ResourceBase, ResourceWithId
 from app.services.service import AbstractService
 
 
@@ -14,16 +22,127 @@ class ResourceService(AbstractService):
         self.booking_repository = booking_repository
 
     async def create(self, resource: ResourceBase) -> ResourceWithId:
-        return await self.resource_repository.create(resource)
+        resource_db = await self.resource_repository.create(resource)
+        get_cache("resources").clear()
+        return resource_db
 
     async def delete(self, id: int):
         await self.resource_repository.delete(id)
+        get_cache("resources").clear()
+        availability_index.invalidate(id)
+
+    async def get(self, id: int, version: int = None) -> ResourceWithId:
+        """
+        Return the resource, from the cache when possible.
+
+        Resources rarely change: reads are cached until the next write. Writes of other workers only clear their own
+        cache, so reads are also cached by the given resources version, for the other workers to miss stale entries.
+        """
+        resource_cache = get_cache("resources")
+        key = ("get", id, version)
+        resource_data = resource_cache.get(key)
+        if resource_data is None:
+            resource_data = ResourceWithId.model_validate(await self.resource_repository.get(id)).model_dump(
+                mode="json"
+            )
+            resource_cache.set(key, resource_data)
+        return ResourceWithId.model_validate(resource_data)
 
-    async def get(self, id: int) -> ResourceWithId:
-        return await self.resource_repository.get(id)
+    async def get_list(
+        self,
+        offset: int,
+        limit: int,
+        name: str = None,
+        location: str = None,
+        room_type: RoomType = None,
+        min_capacity: int = None,
+        after_id: int = None,
+        fields: tuple[str, ...] = None,
+        after_rank: float = None,
+        version: int = None,
+    ) -> list[dict]:
+        """Return the resources matching the filters, cached like `get`."""
+        resource_cache = get_cache("resources")
+        key = ("list", offset, limit, name, location, room_type, min_capacity, after_id, fields, after_rank, version)
+        resources = resource_cache.get(key)
+        if resources is None:
+            rows = await self.resource_repository.get_list(
+                offset,
+                limit,
+                name,
+                location,
+                room_type,
+                min_capacity,
+                after_id=after_id,
+                fields=fields,
+                after_rank=after_rank,
+            )
+            resources = [dict(row) for row in rows]
+            resource_cache.set(key, resources)
+        return resources
 
-    async def get_list(self, offset: int, limit: int, name: str = None, location: str = None) -> list[ResourceWithId]:
-        return await self.resource_repository.get_list(offset, limit, name, location)
+    async def get_available(
+        self,
+        start: datetime,
+        end: datetime,
+        offset: int,
+        limit: int,
+        location: str = None,
+        room_type: RoomType = None,
+        min_capacity: int = None,
+        after_id: int = None,
+        fields: tuple[str, ...] = None,
+        after_rank: float = None,
+    ) -> Sequence[RowMapping]:
+        """Return the resources matching the filters without any booking in the given slot."""
+        # Naive dates are taken as local time, to be compared with the timezone aware booking dates
+        start, end = start.astimezone(), end.astimezone()
+        if end <= start:
+            raise ValidationException("'end' must be after 'start'")
+        return await self.resource_repository.get_list(
+            offset,
+            limit,
+            None,
+            location,
+            room_type,
+            min_capacity,
+            free_start=start,
+            free_end=end,
+            after_id=after_id,
+            fields=fields,
+            after_rank=after_rank,
+        )
 
     async def update(self, id: int, resource: ResourceBase) -> ResourceWithId:
-        return await self.resource_repository.update(id, resource)
+        resource_db = await self.resource_repository.update(id, resource)
+        get_cache("resources").clear()
+        return resource_db
+
+    async def get_free_slots(
+        self, id: int, start: datetime, end: datetime, duration: timedelta, limit: int
+    ) -> list[FreeSlot]:
+        """Return the first free windows of the resource lasting at least the given duration in the given slot."""
+        if duration <= timedelta(0):
+            raise ValidationException("'duration' must be positive")
+        # Naive dates are taken as local time, to be compared with the timezone aware booking dates
+        start, end = start.astimezone(), end.astimezone()
+        if end <= start:
+            raise ValidationException("'to' must be after 'from'")
+        await self.get(id)
+        # Past slots cannot be booked
+        cursor = max(start, datetime.now().astimezone())
+
+        # Sweep bookings by start date: a gap between the end of the previous ones and the next start is free
+        slots = []
+        bookings = self.booking_repository.stream_resource_bookings_in_slot(id, cursor, end)
+        async for booking_start, booking_end in bookings:
+            booking_start, booking_end = booking_start.astimezone(), booking_end.astimezone()
+            if booking_start - cursor >= duration:
+                slots.append(FreeSlot(start=cursor, end=booking_start))
+                if len(slots) >= limit:
+                    await bookings.aclose()
+                    return slots
+            cursor = max(cursor, booking_end)
+        if end - cursor >= duration:
+            slots.append(FreeSlot(start=cursor, end=end))
+        return slots
@@ -1,5 +1,9 @@
+from typing import Sequence
+
 from fastapi import Depends
+from sqlalchemy import RowMapping
 
+from app.core.availability import availability_index
 from app.repositories.user_repository import UserRepository
 from app.schema.user_schema import UserWithId, UserWithPwd
 from app.services.service import AbstractService
@@ -10,13 +14,15 @@ class UserService(AbstractService):
         self.user_repository = user_repository
 
     async def create(self, user: UserWithPwd) -> UserWithId:
-        from app.core.security import hash_password
+        from app.core.security import hash_password_async
 
-        user.password = hash_password(user.password)
+        user.password = await hash_password_async(user.password)
         return await self.user_repository.create(user)
 
     async def delete(self, id: int):
         await self.user_repository.delete(id)
+        # User bookings are deleted in cascade, on any resource
+        availability_index.clear()
 
     async def get(self, id: int) -> UserWithId:
         return await self.user_repository.get(id)
@@ -24,8 +30,8 @@ class UserService(AbstractService):
     async def get_with_username(self, username: str) -> UserWithId:
         return await self.user_repository.get_with_username(username)
 
-    async def get_list(self, offset: int, limit: int) -> list[UserWithId]:
-        return await self.user_repository.get_list(offset, limit)
+    async def get_list(self, offset: int, limit: int, after_id: int = None) -> Sequence[RowMapping]:
+        return await self.user_repository.get_list(offset, limit, after_id)
 
     def update(self, id: int, object):
         """We don't allow user modification."""
@@ -10,6 +10,7 @@ from app.core.settings import get_settings
 from app.models.booking_model import BookingInDb  # noqa
 from app.models.resource_model import ResourceInDb  # noqa
 from app.models.user_model import UserInDb  # noqa
+from app.models.version_model import VersionInDb  # noqa
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,57 @@
+"""add booking no overlap constraint
+
+Revision ID: 33efd04dbb9d
+Revises: 181eea4b31db
+Create Date: 2026-10-18 09:12:41.208315
+
+The previous availability check missed bookings fully inside another one, so
+the database may already hold overlapping bookings, which the constraint
+rejects. The upgrade then stops before changing anything and lists them.
+To remediate, list them with OVERLAPPING_BOOKINGS below, move or delete one
+booking of each pair (e.g. the most recently created, with the highest ID)
+after telling its owner, then run the upgrade again.
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "33efd04dbb9d"
+down_revision: Union[str, None] = "181eea4b31db"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OVERLAPPING_BOOKINGS = """
+SELECT a.resource_id, a.id, b.id
+FROM booking a JOIN booking b ON a.resource_id = b.resource_id AND a.id < b.id
+WHERE a.start < b."end" AND b.start < a."end"
+ORDER BY a.resource_id, a.id, b.id
+"""
+
+
+def upgrade() -> None:
+    # Exclusion constraints are PostgreSQL only, other databases rely on the application check
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    overlaps = op.get_bind().execute(sa.text(OVERLAPPING_BOOKINGS)).all()
+    if overlaps:
+        pairs = "\n".join(f"  resource {resource_id}: bookings {a} and {b}" for resource_id, a, b in overlaps)
+        raise RuntimeError(
+            f"{len(overlaps)} pairs of bookings overlap, move or delete one booking of each pair before upgrading "
+            f"(see this migration docstring):\n{pairs}"
+        )
+    # Needed to mix the scalar 'resource_id' with the range in a GiST index
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist;")
+    op.execute(
+        "ALTER TABLE booking ADD CONSTRAINT booking_no_overlap "
+        'EXCLUDE USING gist (resource_id WITH =, tstzrange(start, "end") WITH &&);'
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.drop_constraint("booking_no_overlap", "booking")
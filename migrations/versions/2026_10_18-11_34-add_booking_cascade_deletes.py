@@ -0,0 +1,34 @@
+"""add booking cascade deletes
+
+Revision ID: f99f0d8ff7d4
+Revises: 492a6a9abd5c
+Create Date: 2026-10-18 11:34:27.148305
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f99f0d8ff7d4"
+down_revision: Union[str, None] = "492a6a9abd5c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Deleting a user or a resource deletes its bookings in the database
+    op.drop_constraint("booking_owner_id_fkey", "booking", type_="foreignkey")
+    op.drop_constraint("booking_resource_id_fkey", "booking", type_="foreignkey")
+    op.create_foreign_key("booking_owner_id_fkey", "booking", "user", ["owner_id"], ["id"], ondelete="CASCADE")
+    op.create_foreign_key(
+        "booking_resource_id_fkey", "booking", "resource", ["resource_id"], ["id"], ondelete="CASCADE"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("booking_resource_id_fkey", "booking", type_="foreignkey")
+    op.drop_constraint("booking_owner_id_fkey", "booking", type_="foreignkey")
+    op.create_foreign_key("booking_resource_id_fkey", "booking", "resource", ["resource_id"], ["id"])
+    op.create_foreign_key("booking_owner_id_fkey", "booking", "user", ["owner_id"], ["id"])
@@ -0,0 +1,45 @@
+"""add search trigram indexes
+
+Revision ID: 7af8c3870037
+Revises: 22a04d68483e
+Create Date: 2026-10-18 13:05:12.874316
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7af8c3870037"
+down_revision: Union[str, None] = "22a04d68483e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Trigram indexes are PostgreSQL only, other databases scan for substring searches
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    op.create_index(
+        "ix_resource_name_trgm", "resource", ["name"], postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+    )
+    op.create_index(
+        "ix_resource_location_trgm",
+        "resource",
+        ["location"],
+        postgresql_using="gin",
+        postgresql_ops={"location": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "ix_booking_title_trgm", "booking", ["title"], postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.drop_index("ix_booking_title_trgm", table_name="booking")
+    op.drop_index("ix_resource_location_trgm", table_name="resource")
+    op.drop_index("ix_resource_name_trgm", table_name="resource")
@@ -0,0 +1,88 @@
+"""
+Benchmark of the list endpoints response path, in rows per second.
+
+Compares fetching ORM objects serialized like a FastAPI response model (validation from attributes, then the
+standard library JSON encoder) with fetching plain rows serialized by `ListResponse`.
+
+Usage: PYTHONPATH=. poetry run python scripts/benchmark_list_serialization.py
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import SQLModel, select
+
+from app.core.responses import ListResponse
+from app.models.booking_model import BookingInDb
+from app.models.resource_model import ResourceInDb, RoomType
+from app.models.user_model import Role, UserInDb
+from app.repositories.repository import schema_columns
+from app.schema.booking_schema import BookingWithId, booking_list_adapter
+
+
+async def orm_response(session: AsyncSession, limit: int) -> bytes:
+    bookings = (await session.execute(select(BookingInDb).order_by(BookingInDb.id).limit(limit))).scalars().all()
+    content = booking_list_adapter.dump_python(
+        booking_list_adapter.validate_python(bookings, from_attributes=True), mode="json"
+    )
+    return JSONResponse(content).body
+
+
+async def rows_response(session: AsyncSession, limit: int) -> bytes:
+    query = select(*schema_columns(BookingInDb, BookingWithId)).order_by(BookingInDb.id).limit(limit)
+    return ListResponse(booking_list_adapter, (await session.execute(query)).mappings().all()).body
+
+
+async def measure(name: str, async_session: sessionmaker, limit: int, rounds: int):
+    function = orm_response if name == "orm" else rows_response
+    start = time.perf_counter()
+    for _ in range(rounds):
+        # New session each round, as in a request, so ORM objects are not served from the identity map
+        async with async_session() as session:
+            body = await function(session, limit)
+    duration = time.perf_counter() - start
+    print(f"{name:>5}: {limit * rounds / duration:>10.0f} rows/s ({len(body)} bytes per page)")
+
+
+async def main(limit: int, rounds: int):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async_session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.execute(
+            insert(UserInDb).values(id=1, name="bench", email="bench@test.com", role=Role.USER, password="-")
+        )
+        await conn.execute(
+            insert(ResourceInDb).values(id=1, name="bench", location="bench", capacity=1, room_type=RoomType.DESK)
+        )
+        start = datetime.now().astimezone() + timedelta(days=1)
+        await conn.execute(
+            insert(BookingInDb),
+            [
+                {
+                    "title": f"Booking {i}",
+                    "start": start + timedelta(hours=i),
+                    "end": start + timedelta(hours=i, minutes=30),
+                    "owner_id": 1,
+                    "resource_id": 1,
+                }
+                for i in range(limit)
+            ],
+        )
+    for name in ("orm", "rows"):
+        await measure(name, async_session, limit, rounds)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, default=1000, help="rows per page")
+    parser.add_argument("--rounds", type=int, default=50, help="pages to serialize")
+    args = parser.parse_args()
+    asyncio.run(main(args.limit, args.rounds))
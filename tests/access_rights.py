@@ -16,6 +16,11 @@ class Access(Enum):
         # Main endpoints
         ("get", "/api/", Access.OPEN),
         ("get", "/api/me", Access.USER),
+        # Admin endpoints
+        ("get", "/api/admin/caches", Access.ADMIN),
+        ("get", "/api/admin/pool", Access.ADMIN),
+        ("get", "/api/admin/slow-queries", Access.ADMIN),
+        ("get", "/api/admin/profile/worker?seconds=0.01", Access.ADMIN),
         # Users endpoints
         ("post", "/api/v1/users/", Access.OPEN),
         ("get", "/api/v1/users/", Access.USER),
@@ -24,11 +29,14 @@ class Access(Enum):
         # Resources endpoints
         ("post", "/api/v1/resources/", Access.ADMIN),
         ("get", "/api/v1/resources/", Access.USER),
+        ("get", "/api/v1/resources/available", Access.USER),
         ("get", "/api/v1/resources/1", Access.USER),
+        ("get", "/api/v1/resources/1/free-slots", Access.USER),
         ("put", "/api/v1/resources/1", Access.ADMIN),
         ("delete", "/api/v1/resources/1", Access.ADMIN),
         # Bookings endpoints
         ("post", "/api/v1/bookings/", Access.USER),
+        ("post", "/api/v1/bookings/batch", Access.USER),
         ("get", "/api/v1/bookings/", Access.USER),
         ("get", "/api/v1/bookings/all", Access.ADMIN),
         ("get", "/api/v1/bookings/1", Access.USER),
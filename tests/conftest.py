@@ -1,16 +1,22 @@
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 import pytest
 import pytest_asyncio
 from fastapi.testclient import TestClient
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import SQLModel
 
 from app.core import settings as main_settings
-from app.core.database import get_session
+from app.core.availability import availability_index
+from app.core.cache import caches
+from app.core.database import get_session, instrument_engine
+from app.core.queries import QueryTracker
 from app.core.security import get_current_user, hash_password
+from app.core.slow_queries import slow_query_log
 from app.main import app
 from app.models.booking_model import BookingInDb
 from app.models.resource_model import ResourceInDb, RoomType
@@ -31,6 +37,7 @@ main_settings.Settings = TestSettings
 async def session():
     """Database session fixture with in memory database."""
     engine = create_async_engine("sqlite+aiosqlite:///:memory:", connect_args={"check_same_thread": False})
+    instrument_engine(engine)
     async_session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
     async with engine.begin() as conn:
@@ -39,6 +46,41 @@ async def session():
         yield session
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.drop_all)
+    availability_index.clear()
+    for cache in caches.values():
+        cache.clear()
+    slow_query_log.clear()
+
+
+@pytest.fixture
+def max_queries(session):
+    """
+    Query budget: fail if the enclosed code runs more queries than allowed, or the same statement N+1 threshold times.
+
+        with max_queries(2):
+            client_user.get("/api/v1/bookings/")
+    """
+
+    @contextmanager
+    def budget(limit: int):
+        # The client shares the session: objects it loaded (e.g. fixtures) would spare the queries of the endpoint
+        session.expunge_all()
+        tracker = QueryTracker()
+
+        def add(conn, cursor, statement, parameters, context, executemany):
+            tracker.add(statement)
+
+        engine = session.bind.sync_engine
+        event.listen(engine, "before_cursor_execute", add)
+        try:
+            yield tracker
+        finally:
+            event.remove(engine, "before_cursor_execute", add)
+        threshold = main_settings.get_settings().N_PLUS_ONE_THRESHOLD
+        assert tracker.count <= limit, tracker.report(threshold)
+        assert not tracker.repeated(threshold), tracker.report(threshold)
+
+    return budget
 
 
 @pytest_asyncio.fixture
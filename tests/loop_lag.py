@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.loop_lag import LoopLagMonitor, loop_blocked, loop_lag
+from app.core.request_context import request_scope
+from app.main import app
+
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="Task.get_context() requires Python 3.12")
+@pytest.mark.asyncio
+async def test_loop_lag(caplog):
+    monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+    lags = sum(entry[-1] for entry in loop_lag.collect().values())
+    route = next(route for route in app.routes if getattr(route, "path", None) == "/api/token")
+    token = request_scope.set({"method": "POST", "path": "/api/token", "route": route})
+    await monitor.start()
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.core.loop_lag"):
+            await asyncio.sleep(0.05)
+            # Blocking call in a request
+            time.sleep(0.3)
+            await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+        request_scope.reset(token)
+
+    # Reported once, with the stack of the blocking call
+    assert len(caplog.records) == 1
+    message = caplog.records[0].message
+    assert message.startswith("Event loop blocked for more than")
+    assert "by POST /api/token" in message
+    assert "time.sleep(0.3)" in message
+    assert loop_blocked.collect()[("POST /api/token",)] == [1]
+    assert sum(entry[-1] for entry in loop_lag.collect().values()) > lags
+
+
+def watchdog_running() -> bool:
+    return any(thread.name == "loop-lag-watchdog" for thread in threading.enumerate())
+
+
+def test_lifespan():
+    # Monitor runs along with the application
+    with TestClient(app):
+        assert watchdog_running()
+    assert not watchdog_running()
@@ -0,0 +1,81 @@
+import threading
+from datetime import timedelta
+
+from app.core.metrics import Counter, Histogram
+from app.core.settings import get_settings
+
+
+def sample(text: str, name: str) -> float:
+    """Return the value of the given sample in the metrics text, 0 if missing."""
+    for line in text.splitlines():
+        if line.startswith(f"{name} "):
+            return float(line.split()[-1])
+    return 0
+
+
+def test_histogram():
+    histogram = Histogram("test_duration_seconds", "Test", ["route"], buckets=(0.1, 1.0))
+    threads = [threading.Thread(target=histogram.observe, args=(value, "/test")) for value in (0.05, 0.5, 0.5, 5)]
+    for thread in threads:
+        thread.start()
+        thread.join()
+
+    # Values recorded by each thread are summed up, buckets are cumulative
+    assert histogram.render().splitlines() == [
+        "# HELP test_duration_seconds Test",
+        "# TYPE test_duration_seconds histogram",
+        'test_duration_seconds_bucket{route="/test",le="0.1"} 1',
+        'test_duration_seconds_bucket{route="/test",le="1.0"} 3',
+        'test_duration_seconds_bucket{route="/test",le="+Inf"} 4',
+        'test_duration_seconds_sum{route="/test"} 6.05',
+        'test_duration_seconds_count{route="/test"} 4',
+    ]
+
+
+def test_counter_labels():
+    counter = Counter("test_total", "Test", ["path"])
+    counter.inc('a "quoted"\\path')
+    assert counter.samples() == ['test_total{path="a \\"quoted\\"\\\\path"} 1']
+
+
+def test_metrics(client_user, booking_user, resource_1, monkeypatch):
+    monkeypatch.setattr(get_settings(), "METRICS_TOKEN", "secret")
+    headers = {"Authorization": "Bearer secret"}
+    before = client_user.get("/metrics", headers=headers).text
+    route = 'http_requests_total{method="GET",route="/api/v1/resources/{id}",status="200"}'
+    rejected = 'booking_not_available_total{operation="create"}'
+
+    # Requests are recorded by route template
+    for _ in range(2):
+        assert client_user.get(f"/api/v1/resources/{resource_1.id}").status_code == 200
+    assert client_user.get("/api/unknown/path").status_code == 404
+    booking_data = {
+        "title": "Booking",
+        "resource_id": resource_1.id,
+        "start": booking_user.start.astimezone().isoformat(),
+        "end": (booking_user.start + timedelta(minutes=10)).astimezone().isoformat(),
+    }
+    assert client_user.post("/api/v1/bookings/", json=booking_data).status_code == 400
+
+    response = client_user.get("/metrics", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert sample(text, route) == sample(before, route) + 2
+    assert 'route="unmatched",status="404"' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/v1/resources/{id}",le="+Inf"}' in text
+    assert sample(text, rejected) == sample(before, rejected) + 1
+    assert sample(text, 'db_queries_total{statement="SELECT"}') > sample(
+        before, 'db_queries_total{statement="SELECT"}'
+    )
+    assert "# TYPE db_pool_checked_out gauge" in text
+
+
+def test_metrics_token(client, monkeypatch):
+    # Disabled without a token
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(get_settings(), "METRICS_TOKEN", "secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer other"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code == 200
@@ -0,0 +1,46 @@
+import asyncio
+import marshal
+
+import httpx
+import pytest
+
+from app.core import profiling
+from app.main import app
+
+
+def test_profile_worker(client_admin):
+    response = client_admin.get("/api/admin/profile/worker", params={"seconds": 0.05})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/octet-stream"
+    stats = marshal.loads(response.content)
+    assert any(function == "sleep" for _, _, function in stats)
+
+    response = client_admin.get("/api/admin/profile/worker", params={"seconds": 0.05, "mode": "collapsed"})
+    assert response.status_code == 200
+    stack, count = response.text.splitlines()[0].rsplit(" ", 1)
+    assert stack.startswith("_bootstrap")
+    assert int(count) >= 1
+
+    response = client_admin.get("/api/admin/profile/worker", params={"seconds": 0.05, "mode": "tracemalloc"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+
+@pytest.mark.asyncio
+async def test_profile_requests(client_admin):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        profile = asyncio.create_task(client.get("/api/admin/profile/requests", params={"count": 2}))
+        while profiling.request_countdown is None:
+            await asyncio.sleep(0.01)
+
+        # Only one profiling at a time
+        response = await client.get("/api/admin/profile/worker", params={"seconds": 0.05})
+        assert response.status_code == 400
+
+        response = await client.get("/api/v1/users/")
+        assert response.status_code == 200
+        response = await profile
+    assert response.status_code == 200
+    assert profiling.request_countdown is None
+    stats = marshal.loads(response.content)
+    assert any(function == "get_list" and "user_service" in filename for filename, _, function in stats)
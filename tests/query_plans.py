@@ -0,0 +1,104 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.booking_model import BookingInDb
+from app.models.resource_model import ResourceInDb, RoomType
+from app.models.user_model import Role, UserInDb
+from app.repositories.booking_repository import BookingRepository
+from app.repositories.resource_repository import ResourceRepository
+
+
+@pytest_asyncio.fixture
+async def seeded_session(session) -> AsyncSession:
+    """Session on a database with enough bookings for the planner to prefer indexes over scans."""
+    await session.execute(
+        insert(UserInDb),
+        [{"name": f"user {i}", "email": f"user{i}@test.com", "role": Role.USER, "password": "-"} for i in range(50)],
+    )
+    await session.execute(
+        insert(ResourceInDb),
+        [{"name": f"room {i}", "location": "france", "capacity": i, "room_type": RoomType.DESK} for i in range(50)],
+    )
+    now = datetime.now().astimezone()
+    await session.execute(
+        insert(BookingInDb),
+        [
+            {
+                "title": f"booking {i}",
+                "start": now + timedelta(hours=i // 50),
+                "end": now + timedelta(hours=i // 50, minutes=30),
+                "owner_id": i % 50 + 1,
+                "resource_id": i % 50 + 1,
+            }
+            for i in range(5000)
+        ],
+    )
+    await session.commit()
+    await session.execute(text("ANALYZE"))
+    return session
+
+
+@contextmanager
+def captured_queries(session: AsyncSession):
+    """Capture the (statement, parameters) sent to the database by the session."""
+    queries = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        queries.append((statement, parameters))
+
+    engine = session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+async def explain(session: AsyncSession, statement: str, parameters) -> list[str]:
+    """Return the query plan of the statement, one line per step."""
+    connection = await session.connection()
+    if connection.dialect.name == "postgresql":
+        result = await connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return [row[0] for row in result]
+    result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    return [row[3] for row in result]
+
+
+async def assert_no_full_scan(session: AsyncSession, queries: list, table: str):
+    """Fail if the plan of any of the queries reads the whole table instead of searching an index."""
+    assert queries
+    for statement, parameters in queries:
+        for step in await explain(session, statement, parameters):
+            # PostgreSQL 'Seq Scan on booking', SQLite 'SCAN booking' (an index search is 'SEARCH booking ...')
+            assert not step.lstrip(" ->").startswith((f"Seq Scan on {table}", f"SCAN {table}")), (statement, step)
+
+
+@pytest.mark.asyncio
+async def test_booking_queries(seeded_session):
+    repository = BookingRepository(seeded_session, seeded_session)
+    now = datetime.now().astimezone()
+
+    with captured_queries(seeded_session) as queries:
+        await repository.get_list(0, 100, owner_id=3)
+        await repository.get_list(0, 100, owner_id=3, after_id=1000)
+        await repository.get_resources_schedules([1, 2, 3], now)
+        await repository.get_resource_bookings_in_slot(3, now, now + timedelta(hours=5))
+        async for _ in repository.stream_resource_bookings_in_slot(3, now, now + timedelta(hours=5)):
+            pass
+    await assert_no_full_scan(seeded_session, queries, "booking")
+
+
+@pytest.mark.asyncio
+async def test_resource_available_query(seeded_session):
+    repository = ResourceRepository(seeded_session, seeded_session)
+    now = datetime.now().astimezone()
+
+    with captured_queries(seeded_session) as queries:
+        await repository.get_list(0, 100, free_start=now, free_end=now + timedelta(hours=1))
+    # The anti-join looks up the bookings of each resource
+    await assert_no_full_scan(seeded_session, queries, "booking")
@@ -1,6 +1,14 @@
+from datetime import datetime, timedelta
+
 import pytest
+from sqlmodel import select
 
+from app.core.cache import get_cache
+from app.core.exceptions import DuplicateException, ValidationException
+from app.models.booking_model import BookingInDb
 from app.models.resource_model import ResourceInDb, RoomType
+from app.repositories.resource_repository import ResourceRepository
+from app.schema.resource_schema import ResourceBase
 
 
 def test_create(client_admin):
@@ -37,6 +45,8 @@ async def test_list(session, client_user):
     await session.refresh(resource_1)
     await session.refresh(resource_2)
     await session.refresh(resource_3)
+    # Written without the service: cached lists are not invalidated
+    get_cache("resources").clear()
 
     response = client_user.get("/api/v1/resources/")
     assert response.status_code == 200
@@ -54,12 +64,17 @@ async def test_list(session, client_user):
     assert response.status_code == 200
     assert len(response.json()) == 1
 
+    response = client_user.get("/api/v1/resources/", params={"room_type": RoomType.AUDITORIUM, "min_capacity": 1})
+    assert response.status_code == 200
+    assert len(response.json()) == 0
+
 
-def test_get(client_user, resource_1):
+def test_get(client_user, resource_1, max_queries):
     response = client_user.get("/api/v1/resources/9999")
     assert response.status_code == 404
 
-    response = client_user.get(f"/api/v1/resources/{resource_1.id}")
+    with max_queries(2):
+        response = client_user.get(f"/api/v1/resources/{resource_1.id}")
     data = response.json()
     assert response.status_code == 200
     assert data["id"] == resource_1.id
@@ -69,14 +84,168 @@ def test_get(client_user, resource_1):
     assert data["room_type"] == resource_1.room_type.value
 
 
+def test_fields(client_user, resource_1):
+    response = client_user.get("/api/v1/resources/", params={"fields": "name"})
+    assert response.status_code == 200
+    assert response.json() == [{"id": resource_1.id, "name": resource_1.name}]
+
+    response = client_user.get(f"/api/v1/resources/{resource_1.id}", params={"fields": "capacity, name"})
+    assert response.status_code == 200
+    assert response.json() == {"id": resource_1.id, "name": resource_1.name, "capacity": resource_1.capacity}
+
+    response = client_user.get("/api/v1/resources/", params={"fields": "name,password"})
+    assert response.status_code == 400
+
+
+def test_cache(client_user, client_admin, resource_1):
+    name = resource_1.name
+    stats = get_cache("resources").stats()
+
+    # Reads are loaded from database once, then from cache
+    for _ in range(2):
+        assert client_user.get("/api/v1/resources/", params={"name": name}).status_code == 200
+        assert client_user.get(f"/api/v1/resources/{resource_1.id}").status_code == 200
+    assert get_cache("resources").stats().misses == stats.misses + 2
+    assert get_cache("resources").stats().hits == stats.hits + 2
+
+    # Writes invalidate the cache
+    resource_data = {"name": "renamed", "location": "france", "capacity": 2, "room_type": RoomType.DESK}
+    assert client_admin.put(f"/api/v1/resources/{resource_1.id}", json=resource_data).status_code == 200
+    assert client_user.get(f"/api/v1/resources/{resource_1.id}").json()["name"] == "renamed"
+    assert client_user.get("/api/v1/resources/", params={"name": name}).json() == []
+
+    assert client_admin.delete(f"/api/v1/resources/{resource_1.id}").status_code == 204
+    assert client_user.get(f"/api/v1/resources/{resource_1.id}").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_cache_other_worker(session, client_user, resource_1):
+    assert client_user.get(f"/api/v1/resources/{resource_1.id}").json()["name"] == resource_1.name
+    assert len(client_user.get("/api/v1/resources/").json()) == 1
+
+    # Written by another worker: this worker cache is not cleared, but its entries are outdated by the new version
+    resource = ResourceBase(name="renamed", location="france", capacity=2, room_type=RoomType.DESK)
+    await ResourceRepository(session, session).update(resource_1.id, resource)
+    await ResourceRepository(session, session).create(resource.model_copy(update={"name": "other"}))
+    assert client_user.get(f"/api/v1/resources/{resource_1.id}").json()["name"] == "renamed"
+    assert len(client_user.get("/api/v1/resources/").json()) == 2
+
+
+def test_etag(client_admin, resource_1, resource_2):
+    response = client_admin.get("/api/v1/resources/", params={"name": resource_1.name})
+    etag = response.headers["ETag"]
+    list_etag = etag
+    response = client_admin.get(
+        "/api/v1/resources/", params={"name": resource_1.name}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    etag = client_admin.get(f"/api/v1/resources/{resource_1.id}").headers["ETag"]
+    response = client_admin.get(f"/api/v1/resources/{resource_1.id}", headers={"If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304
+    # Each resource has its own ETag
+    assert etag not in (list_etag, client_admin.get(f"/api/v1/resources/{resource_2.id}").headers["ETag"])
+    response = client_admin.get(f"/api/v1/resources/{resource_2.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+    # Any ETag matches an existing resource only
+    response = client_admin.get(f"/api/v1/resources/{resource_1.id}", headers={"If-None-Match": "*"})
+    assert response.status_code == 304
+    response = client_admin.get("/api/v1/resources/9999", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+
+    resource_data = {"name": "renamed", "location": "france", "capacity": 2, "room_type": RoomType.DESK}
+    assert client_admin.put(f"/api/v1/resources/{resource_1.id}", json=resource_data).status_code == 200
+    response = client_admin.get(f"/api/v1/resources/{resource_1.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["name"] == "renamed"
+
+
+def test_available(client_user, resource_1, resource_2, booking_user):
+    start, end = booking_user.start.astimezone(), booking_user.end.astimezone()
+    params = {"start": (start + timedelta(minutes=30)).isoformat(), "end": (end + timedelta(hours=1)).isoformat()}
+    response = client_user.get("/api/v1/resources/available", params=params)
+    assert response.status_code == 200
+    assert [r["id"] for r in response.json()] == [resource_2.id]
+
+    # Slot right after the booking
+    params = {"start": end.isoformat(), "end": (end + timedelta(hours=1)).isoformat()}
+    response = client_user.get("/api/v1/resources/available", params=params)
+    assert response.status_code == 200
+    assert {r["id"] for r in response.json()} == {resource_1.id, resource_2.id}
+
+    response = client_user.get("/api/v1/resources/available", params={**params, "min_capacity": 20})
+    assert response.status_code == 200
+    assert [r["id"] for r in response.json()] == [resource_2.id]
+
+    response = client_user.get("/api/v1/resources/available", params={**params, "room_type": RoomType.MEETING_ROOM})
+    assert response.status_code == 200
+    assert [r["id"] for r in response.json()] == [resource_1.id]
+
+    response = client_user.get("/api/v1/resources/available", params={**params, "location": "spa"})
+    assert response.status_code == 200
+    assert [r["id"] for r in response.json()] == [resource_2.id]
+
+    response = client_user.get("/api/v1/resources/available", params={"start": params["end"], "end": params["start"]})
+    assert response.status_code == 400
+
+    # Naive dates are taken as local time
+    params["start"] = end.replace(tzinfo=None).isoformat()
+    response = client_user.get("/api/v1/resources/available", params=params)
+    assert response.status_code == 200
+    assert {r["id"] for r in response.json()} == {resource_1.id, resource_2.id}
+
+
+def test_free_slots(client_user, resource_1, booking_user, booking_admin):
+    now = datetime.now().astimezone()
+    params = {"from": now.isoformat(), "to": (now + timedelta(hours=6)).isoformat(), "duration": "PT50M"}
+    response = client_user.get("/api/v1/resources/9999/free-slots", params=params)
+    assert response.status_code == 404
+
+    response = client_user.get(f"/api/v1/resources/{resource_1.id}/free-slots", params=params)
+    data = response.json()
+    assert response.status_code == 200
+    assert len(data) == 3
+    assert datetime.fromisoformat(data[0]["end"]) == booking_user.start.astimezone()
+    assert datetime.fromisoformat(data[1]["start"]) == booking_user.end.astimezone()
+    assert datetime.fromisoformat(data[1]["end"]) == booking_admin.start.astimezone()
+    assert datetime.fromisoformat(data[2]["start"]) == booking_admin.end.astimezone()
+    assert datetime.fromisoformat(data[2]["end"]) == now + timedelta(hours=6)
+
+    response = client_user.get(f"/api/v1/resources/{resource_1.id}/free-slots", params={**params, "limit": 2})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+    # Only the gap between both bookings is long enough
+    response = client_user.get(f"/api/v1/resources/{resource_1.id}/free-slots", params={**params, "duration": "PT2H"})
+    data = response.json()
+    assert response.status_code == 200
+    assert len(data) == 1
+    assert datetime.fromisoformat(data[0]["start"]) == booking_user.end.astimezone()
+
+    response = client_user.get(
+        f"/api/v1/resources/{resource_1.id}/free-slots", params={**params, "to": params["from"]}
+    )
+    assert response.status_code == 400
+
+    # Naive dates are taken as local time, with the default aware 'from' too
+    naive = {"to": (now + timedelta(hours=6)).replace(tzinfo=None).isoformat(), "duration": "PT50M"}
+    for naive_params in (naive, {**naive, "from": now.replace(tzinfo=None).isoformat()}):
+        response = client_user.get(f"/api/v1/resources/{resource_1.id}/free-slots", params=naive_params)
+        assert response.status_code == 200
+        assert datetime.fromisoformat(response.json()[1]["start"]) == booking_user.end.astimezone()
+
+
 @pytest.mark.asyncio
-async def test_delete(session, client_admin, resource_1):
+async def test_delete(session, client_admin, resource_1, booking_user):
     response = client_admin.delete("/api/v1/resources/9999")
     assert response.status_code == 404
 
     response = client_admin.delete(f"/api/v1/resources/{resource_1.id}")
     assert response.status_code == 204
     assert not await session.get(ResourceInDb, resource_1.id)
+    # Bookings are deleted by the database
+    assert not (await session.execute(select(BookingInDb.id).where(BookingInDb.id == booking_user.id))).first()
 
 
 @pytest.mark.asyncio
@@ -110,3 +279,16 @@ async def test_update(client_admin, resource_1):
     assert data["location"] == resource_data["location"]
     assert data["capacity"] == resource_data["capacity"]
     assert data["room_type"] == resource_data["room_type"]
+
+
+@pytest.mark.asyncio
+async def test_integrity_error_rollback(session, resource_1, resource_2):
+    repository = ResourceRepository(session, session)
+    name, id, resource = resource_1.name, resource_2.id, ResourceBase.model_validate(resource_2)
+    with pytest.raises(DuplicateException):
+        await repository.create(resource.model_copy(update={"name": name}))
+    # The session is usable again
+    assert not session.in_transaction()
+    with pytest.raises(ValidationException):
+        await repository.update(id, resource.model_copy(update={"name": name}))
+    assert not session.in_transaction()
@@ -1,3 +1,16 @@
+import json
+import logging
+import threading
+
+import pytest
+
+from app.core import security
+from app.core.cache import get_cache
+from app.core.settings import get_settings
+from app.core.timing import RequestTimings
+from app.repositories.user_repository import UserRepository
+
+
 def test_hello_world(client):
     response = client.get("/api/")
     assert response.status_code == 200
@@ -14,6 +27,17 @@ def test_login(client, base_user):
     assert token is not None
 
 
+def test_login_overload(client, base_user, monkeypatch):
+    # All password hashing slots are busy
+    password_slots = threading.BoundedSemaphore(1)
+    password_slots.acquire()
+    monkeypatch.setattr(security, "password_slots", password_slots)
+
+    response = client.post("/api/token", data={"username": base_user.email, "password": "password"})
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
 def test_me(client_user, base_user):
     response = client_user.get("/api/me")
     data = response.json()
@@ -22,3 +46,78 @@ def test_me(client_user, base_user):
     assert data["id"] == base_user.id
     assert data["name"] == base_user.name
     assert data["email"] == base_user.email
+
+
+@pytest.mark.asyncio
+async def test_user_cache(session, client, base_user):
+    response = client.post("/api/token", data={"username": base_user.email, "password": "password"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    stats = get_cache("users").stats()
+
+    # User is loaded from database once, then from cache
+    for _ in range(2):
+        response = client.get("/api/me", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["id"] == base_user.id
+    assert get_cache("users").stats().misses == stats.misses + 1
+    assert get_cache("users").stats().hits == stats.hits + 1
+
+    # Deleted user is removed from cache
+    await UserRepository(session, session).delete(base_user.id)
+    response = client.get("/api/me", headers=headers)
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_stateless_token(session, client, base_user, monkeypatch):
+    monkeypatch.setattr(get_settings(), "STATELESS_TOKENS", True)
+    response = client.post("/api/token", data={"username": base_user.email, "password": "password"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    await session.delete(base_user)
+    await session.commit()
+    # User is not loaded from database
+    response = client.get("/api/v1/bookings/", headers=headers)
+    assert response.status_code == 200
+    # Except for endpoints requiring it
+    response = client.get("/api/me", headers=headers)
+    assert response.status_code == 401
+
+
+def test_admin_caches(client_admin):
+    response = client_admin.get("/api/admin/caches")
+    assert response.status_code == 200
+    assert set(response.json()) == {"users", "resources"}
+    assert set(response.json()["users"]) == {"hits", "misses", "size", "maxsize", "hit_rate"}
+
+
+def test_server_timing(client, base_user, booking_user, monkeypatch, caplog):
+    response = client.post("/api/token", data={"username": base_user.email, "password": "password"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = client.get("/api/v1/bookings/", headers=headers)
+    assert "Server-Timing" not in response.headers
+
+    monkeypatch.setattr(get_settings(), "SERVER_TIMING", True)
+    monkeypatch.setattr(get_settings(), "SERVER_TIMING_LOG", True)
+    with caplog.at_level(logging.INFO, logger="app.core.timing"):
+        response = client.get("/api/v1/bookings/", headers=headers)
+    assert response.status_code == 200
+    metrics = {metric.split(";")[0]: metric for metric in response.headers["Server-Timing"].split(", ")}
+    assert set(metrics) == {"auth", "db", "dependencies", "service", "serialization", "total"}
+    assert 'desc="' in metrics["db"]
+
+    log = json.loads(caplog.records[-1].message)
+    assert log["path"] == "/api/v1/bookings/"
+    assert log["status"] == 200
+    assert log["queries"] >= 1
+
+
+def test_request_timings():
+    timings = RequestTimings()
+    timings.start("service")
+    timings.start("db")
+    # Unknown phases are ignored, nested ones left running by an error are dropped
+    timings.stop("serialization")
+    timings.stop("service")
+    assert timings.stack == []
+    assert set(timings.durations) == {"service"}
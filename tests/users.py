@@ -1,6 +1,11 @@
 import pytest
+from sqlmodel import select
 
+from app.core.exceptions import DuplicateException
+from app.models.booking_model import BookingInDb
 from app.models.user_model import Role, UserInDb
+from app.repositories.user_repository import UserRepository
+from app.schema.user_schema import UserWithPwd
 
 
 def test_create(client):
@@ -21,7 +26,7 @@ def test_create(client):
 
 
 @pytest.mark.asyncio
-async def test_list(session, client_user):
+async def test_list(session, client_user, max_queries):
     response = client_user.get("/api/v1/users/")
     assert response.status_code == 200
     # Because of fixtures
@@ -35,16 +40,46 @@ async def test_list(session, client_user):
     await session.refresh(user_1)
     await session.refresh(user_2)
 
-    response = client_user.get("/api/v1/users/")
+    with max_queries(1):
+        response = client_user.get("/api/v1/users/")
     assert response.status_code == 200
     assert len(response.json()) == user_count + 2
 
 
-def test_get(session, client_user, base_user):
+@pytest.mark.asyncio
+async def test_list_cursor(session, client_user):
+    for i in range(5):
+        session.add(UserInDb(name=f"user{i}", email=f"user{i}@test.com", password="pwd"))
+    await session.commit()
+    response = client_user.get("/api/v1/users/", params={"limit": 10000000})
+    assert response.status_code == 200
+    user_ids = [user["id"] for user in response.json()]
+    assert user_ids == sorted(user_ids)
+    assert "Link" not in response.headers
+
+    # Follow next page cursors
+    page_ids = []
+    params = {"limit": 2}
+    while True:
+        response = client_user.get("/api/v1/users/", params=params)
+        assert response.status_code == 200
+        page_ids += [user["id"] for user in response.json()]
+        if "X-Next-Cursor" not in response.headers:
+            break
+        assert 'rel="next"' in response.headers["Link"]
+        params["cursor"] = response.headers["X-Next-Cursor"]
+    assert page_ids == user_ids
+
+    response = client_user.get("/api/v1/users/", params={"cursor": "invalid"})
+    assert response.status_code == 400
+
+
+def test_get(session, client_user, base_user, max_queries):
     response = client_user.get("/api/v1/users/9999")
     assert response.status_code == 404
 
-    response = client_user.get(f"/api/v1/users/{base_user.id}")
+    with max_queries(1):
+        response = client_user.get(f"/api/v1/users/{base_user.id}")
     data = response.json()
     assert response.status_code == 200
     assert data["id"] == base_user.id
@@ -54,10 +89,21 @@ def test_get(session, client_user, base_user):
 
 
 @pytest.mark.asyncio
-async def test_delete(session, client_admin, base_user):
+async def test_delete(session, client_admin, base_user, booking_user):
     response = client_admin.delete("/api/v1/users/9999")
     assert response.status_code == 404
 
     response = client_admin.delete(f"/api/v1/users/{base_user.id}")
     assert response.status_code == 204
     assert not await session.get(UserInDb, base_user.id)
+    # Bookings are deleted by the database
+    assert not (await session.execute(select(BookingInDb.id).where(BookingInDb.id == booking_user.id))).first()
+
+
+@pytest.mark.asyncio
+async def test_integrity_error_rollback(session, base_user):
+    user = UserWithPwd(name="Other", email=base_user.email, password="pwd", role=Role.USER)
+    with pytest.raises(DuplicateException):
+        await UserRepository(session, session).create(user)
+    # The session is usable again
+    assert not session.in_transaction()